@@ -1,4 +1,5 @@
 from flask import request, jsonify, current_app, send_file, session
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 import os
 import uuid
@@ -127,22 +128,40 @@ def upload_file():
             db.session.commit()
             
             # Generate output path for processed file
-            output_path = file_manager.get_processed_file_path(
+            output_path, relative_output_path = file_manager.get_processed_file_paths(
                 user_id=None, 
                 job_id=job.id, 
                 original_filename=file.filename,
                 session_id=session_id
             )
             
-            # Process the PDF
-            processing_result = pdf_processor.process_pdf(
-                job_id=job.id,
-                input_path=upload_result['file_path'],
-                output_path=output_path,  # Now properly set
-                quality_preset=quality_preset
-            )
+            job_id = job.id
+            if pdf_processor.use_task_queue:
+                # Hand off to a Celery worker; clients poll /process/status for the result
+                pdf_processor.process_pdf_async(
+                    job_id=job_id,
+                    input_path=upload_result['file_path'],
+                    output_path=output_path,
+                    quality_preset=quality_preset,
+                    relative_output_path=relative_output_path
+                )
+                processing_result = None
+            else:
+                # Process the PDF
+                processing_result = pdf_processor.process_pdf(
+                    job_id=job_id,
+                    input_path=upload_result['file_path'],
+                    output_path=output_path,  # Now properly set
+                    quality_preset=quality_preset,
+                    relative_output_path=relative_output_path
+                )
+                
+                # The processor closes the session while Ghostscript runs
+                job = db.session.get(ProcessingJob, job_id)
             
-            if processing_result['success']:
+            if processing_result is None:
+                pass  # Queued; the worker records the outcome
+            elif processing_result['success']:
                 # Update job with results
                 job.status = 'completed'
                 job.completed_at = datetime.utcnow()
@@ -200,8 +219,17 @@ def upload_file():
             }
         }
         
+        # Queued jobs report how long processing is likely to take
+        if job.status == 'processing':
+            response_data['job']['estimated_time'] = pdf_processor.estimate_processing_time(
+                job.original_size, job.quality_preset
+            )
+        
         return jsonify(response_data), 200 if job.status == 'completed' else 202
         
+    except RequestEntityTooLarge:
+        # Let the app's 413 handler answer oversized bodies
+        raise
     except Exception as e:
         current_app.logger.error(f"Upload API error: {e}")
         return jsonify({
@@ -273,7 +301,7 @@ def get_job_status(job_id):
                 'message': 'Session not found'
             }), 401
         
-        job = ProcessingJob.query.get(job_id)
+        job = db.session.get(ProcessingJob, job_id)
         
         if not job:
             return jsonify({
@@ -301,7 +329,8 @@ def get_job_status(job_id):
                 'created_at': job.created_at.isoformat(),
                 'started_at': job.started_at.isoformat() if job.started_at else None,
                 'completed_at': job.completed_at.isoformat() if job.completed_at else None,
-                'error_message': job.error_message
+                'error_message': job.error_message,
+                'task_id': job.task_id
             }
         }
         
@@ -329,7 +358,7 @@ def download_processed_file(job_id):
                 'message': 'Session not found'
             }), 401
         
-        job = ProcessingJob.query.get(job_id)
+        job = db.session.get(ProcessingJob, job_id)
         
         if not job:
             return jsonify({
@@ -471,7 +500,7 @@ def get_session_jobs():
 def delete_job(job_id):
     """Delete processing job and associated files (no authentication required)."""
     try:
-        job = ProcessingJob.query.get(job_id)
+        job = db.session.get(ProcessingJob, job_id)
         
         if not job:
             return jsonify({
@@ -27,6 +27,7 @@ from main import main as main_blueprint
 # Import services
 from services.pdf_processor import pdf_processor
 from services.file_manager import file_manager
+from services.task_queue import celery, init_celery
 from utils.security import rate_limiter
 from utils.timezone import utc_to_ist, format_ist_datetime, format_ist_iso
 
@@ -179,6 +180,7 @@ def init_services(app):
     pdf_processor.init_app(app)
     file_manager.init_app(app)
     rate_limiter.init_app(app)
+    init_celery(app)
 
 def setup_logging(app):
     """Set up application logging."""
@@ -308,10 +310,32 @@ def create_database_tables():
             print("Database tables created successfully")
         else:
             print("Database tables already exist")
+            upgrade_database_schema(inspector)
     except Exception as e:
         print(f"Error creating database tables: {e}")
         # Continue execution even if database setup fails
 
+# Columns added after the first release: (table, column, column DDL)
+SCHEMA_UPGRADES = [
+    ('processing_job', 'task_id', 'VARCHAR(155)'),
+]
+
+def upgrade_database_schema(inspector):
+    """Add columns that existing databases were created without."""
+    from sqlalchemy import text
+    existing_tables = set(inspector.get_table_names())
+    
+    for table, column, ddl in SCHEMA_UPGRADES:
+        if table not in existing_tables:
+            continue
+        columns = {col['name'] for col in inspector.get_columns(table)}
+        if column in columns:
+            continue
+        
+        with db.engine.begin() as connection:
+            connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+        print(f"Added column {table}.{column}")
+
 def setup_health_checks(app):
         import traceback
         print(f"Traceback: {traceback.format_exc()}")
@@ -7,6 +7,7 @@ from .decorators import validate_json_request, handle_exceptions, log_api_access
 from models import db
 from models.user import User
 from models.audit_log import AuditLog
+from utils.security import SecurityUtils, rate_limiter
 import re
 
 def validate_email(email):
@@ -212,6 +213,20 @@ def login():
             flash('Invalid email format.', 'error')
             return render_template('auth/login.html'), 400
     
+    # Optional lockout after repeated failures from the client's IP (off by default)
+    client_ip, _ = SecurityUtils.get_client_info()
+    if rate_limiter.login_lockout_enabled:
+        allowed, message = rate_limiter.check_login_attempts(client_ip, email)
+        if not allowed:
+            if is_api_request:
+                return jsonify({
+                    'success': False,
+                    'message': message
+                }), 429
+            else:
+                flash(message, 'error')
+                return render_template('auth/login.html'), 429
+    
     # Find user
     try:
         user = User.query.filter_by(email=email).first()
@@ -240,6 +255,7 @@ def login():
             )
         except Exception as e:
             current_app.logger.error(f"Error logging failed login: {e}")
+        rate_limiter.record_failed_login(client_ip)
         
         error_message = 'Invalid email or password'
         if is_api_request:
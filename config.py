@@ -1,5 +1,6 @@
 import os
 from datetime import timedelta
+from sqlalchemy.pool import StaticPool
 
 class Config:
     """Base configuration class."""
@@ -13,6 +14,8 @@ class Config:
     # File Upload Configuration
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 26214400))  # 25MB default
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'storage')
+    # Overwrite files with random data before deleting them ('auto' skips it on SSD/copy-on-write storage)
+    SECURE_DELETE_OVERWRITE = os.environ.get('SECURE_DELETE_OVERWRITE', 'auto').lower()
     
     # Security Configuration
     WTF_CSRF_ENABLED = os.environ.get('CSRF_ENABLED', 'true').lower() == 'true'
@@ -28,10 +31,29 @@ class Config:
     SESSION_STORAGE_LIMIT_MB = int(os.environ.get('SESSION_STORAGE_LIMIT_MB', 100))
     CONCURRENT_UPLOADS = int(os.environ.get('CONCURRENT_UPLOADS', 3))
     LOGIN_ATTEMPTS_PER_HOUR = int(os.environ.get('LOGIN_ATTEMPTS_PER_HOUR', 10))
+    # Reject logins from IPs over LOGIN_ATTEMPTS_PER_HOUR failures (only with REDIS_URL set)
+    LOGIN_LOCKOUT_ENABLED = os.environ.get('LOGIN_LOCKOUT_ENABLED', 'false').lower() == 'true'
     
     # Processing Configuration
     GHOSTSCRIPT_PATH = os.environ.get('GHOSTSCRIPT_PATH', '/usr/bin/gs')
     PROCESSING_TIMEOUT = int(os.environ.get('PROCESSING_TIMEOUT', 300))  # 5 minutes
+    # Persistent Ghostscript workers (0 disables the pool; nproc - 1 is a good size)
+    GHOSTSCRIPT_POOL_SIZE = int(os.environ.get('GHOSTSCRIPT_POOL_SIZE', 0))
+    GHOSTSCRIPT_POOL_MAX_JOBS = int(os.environ.get('GHOSTSCRIPT_POOL_MAX_JOBS', 50))  # Recycle workers
+    MAX_CONCURRENT_GS = int(os.environ.get('MAX_CONCURRENT_GS', os.cpu_count() or 1))  # Parallel gs processes
+    # Optional fast scratch directory (e.g. tmpfs) for Ghostscript output before it moves into storage
+    PROCESSING_SCRATCH_DIR = os.environ.get('PROCESSING_SCRATCH_DIR')
+    # PDFs under this size with little image data skip Ghostscript (0 disables)
+    SKIP_COMPRESSION_BELOW_BYTES = int(os.environ.get('SKIP_COMPRESSION_BELOW_BYTES', 204800))  # 200KB
+    # Split PDFs with more pages than this across parallel gs processes (0 disables, e.g. 50).
+    # Outline, named destinations and metadata are carried over, but AcroForm fields are not,
+    # and fonts shared across page ranges are embedded once per range (slightly larger output).
+    PARALLEL_PAGE_THRESHOLD = int(os.environ.get('PARALLEL_PAGE_THRESHOLD', 0))
+    
+    # Task Queue Configuration (Celery is only used when a broker is set)
+    REDIS_URL = os.environ.get('REDIS_URL')
+    CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or REDIS_URL
+    CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND') or CELERY_BROKER_URL
     
     # Cleanup Configuration
     CLEANUP_ENABLED = os.environ.get('CLEANUP_ENABLED', 'true').lower() == 'true'
@@ -163,6 +185,11 @@ class TestingConfig(Config):
     """Testing configuration."""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    # One shared in-memory connection so the test client sees the same database
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'poolclass': StaticPool,
+        'connect_args': {'check_same_thread': False},
+    }
     WTF_CSRF_ENABLED = False
 
 config = {
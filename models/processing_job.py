@@ -30,6 +30,7 @@ class ProcessingJob(db.Model):
     # Error handling
     error_message = db.Column(db.Text, nullable=True)
     retry_count = db.Column(db.Integer, default=0, nullable=False)
+    task_id = db.Column(db.String(155), nullable=True)  # Celery task ID when queued
     
     # File paths (relative to storage directory)
     upload_path = db.Column(db.String(500), nullable=False)
@@ -176,6 +177,7 @@ class ProcessingJob(db.Model):
             'expires_at': self.expires_at.isoformat(),
             'error_message': self.error_message,
             'retry_count': self.retry_count,
+            'task_id': self.task_id,
             'is_expired': self.is_expired,
             'time_remaining': self.time_remaining_formatted,
             'progress': self.get_progress_info()
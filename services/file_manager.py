@@ -29,10 +29,39 @@ class FileManager:
         # Create directory structure
         self._create_directory_structure()
         
+        # Resolve the allowed storage roots once for path validation
+        self._download_roots = SecurityUtils.resolve_allowed_roots([
+            os.path.join(self.upload_folder, 'processed'),
+            os.path.join(self.upload_folder, 'uploads')
+        ])
+        self._storage_roots = SecurityUtils.resolve_allowed_roots([
+            os.path.join(self.upload_folder, 'uploads'),
+            os.path.join(self.upload_folder, 'processed'),
+            os.path.join(self.upload_folder, 'temp')
+        ])
+        
+        # Decide once whether overwriting before deletion does anything on this storage
+        overwrite_setting = str(app.config.get('SECURE_DELETE_OVERWRITE', 'auto')).lower()
+        if overwrite_setting == 'auto':
+            self.secure_delete_overwrite = SecurityUtils.overwrite_is_effective(self.upload_folder)
+        else:
+            self.secure_delete_overwrite = overwrite_setting in ('true', '1', 'yes')
+        
         # Start cleanup thread if enabled
         if self.cleanup_enabled:
             self._start_cleanup_thread()
     
+    @staticmethod
+    def _save_stream(file, file_path, chunk_size=1024 * 1024):
+        """Copy an uploaded file's stream to disk and return the bytes written."""
+        file_size = 0
+        read = file.stream.read
+        with open(file_path, 'wb') as out:
+            for chunk in iter(lambda: read(chunk_size), b''):
+                out.write(chunk)
+                file_size += len(chunk)
+        return file_size
+    
     def _create_directory_structure(self):
         """Create required directory structure."""
         directories = [
@@ -65,15 +94,8 @@ class FileManager:
             # Full file path
             file_path = os.path.join(upload_dir, secure_name)
             
-            # Save file
-            file.save(file_path)
-            
-            # Verify file was saved correctly
-            if not os.path.exists(file_path):
-                raise IOError("File was not saved correctly")
-            
-            # Get file size
-            file_size = os.path.getsize(file_path)
+            # Save file, counting bytes as they are written
+            file_size = self._save_stream(file, file_path)
             
             # Log file upload
             AuditLog.log_file_upload(
@@ -120,6 +142,14 @@ class FileManager:
         
         return os.path.join(processed_dir, processed_filename)
     
+    def get_processed_file_paths(self, user_id, job_id, original_filename, session_id=None):
+        """Generate the absolute and upload-folder-relative paths for a processed file."""
+        output_path = self.get_processed_file_path(user_id, job_id, original_filename, session_id)
+        
+        # Processed paths are always built under upload_folder, so strip the prefix
+        prefix = os.path.join(self.upload_folder, '')
+        return output_path, output_path[len(prefix):]
+    
     def create_temp_directory(self, job_id):
         """Create temporary directory for processing."""
         temp_dir = os.path.join(self.upload_folder, 'temp', str(job_id))
@@ -157,7 +187,7 @@ class FileManager:
                 for upload_path in upload_paths_to_try:
                     current_app.logger.debug(f"Trying upload path: {upload_path}")
                     if os.path.exists(upload_path):
-                        if SecurityUtils.secure_delete_file(upload_path):
+                        if SecurityUtils.secure_delete_file(upload_path, overwrite=self.secure_delete_overwrite):
                             current_app.logger.info(f"Successfully deleted upload file: {upload_path}")
                             files_deleted += 1
                             break
@@ -178,7 +208,7 @@ class FileManager:
                 for processed_path in processed_paths_to_try:
                     current_app.logger.debug(f"Trying processed path: {processed_path}")
                     if os.path.exists(processed_path):
-                        if SecurityUtils.secure_delete_file(processed_path):
+                        if SecurityUtils.secure_delete_file(processed_path, overwrite=self.secure_delete_overwrite):
                             current_app.logger.info(f"Successfully deleted processed file: {processed_path}")
                             files_deleted += 1
                             break
@@ -208,7 +238,7 @@ class FileManager:
                 files_cleared += self.delete_job_files(job)
             
             # Update user session storage counter
-            user = User.query.get(user_id)
+            user = db.session.get(User, user_id)
             if user:
                 user.clear_session_storage()
                 db.session.commit()
@@ -299,7 +329,7 @@ class FileManager:
                 current_app.logger.info(f"Deleted user processed directory: {user_processed_dir}")
             
             # Reset user storage counters
-            user = User.query.get(user_id)
+            user = db.session.get(User, user_id)
             if user:
                 user.clear_session_storage()
                 user.storage_used = 0  # Reset total storage used
@@ -349,12 +379,7 @@ class FileManager:
             return None
         
         # Verify path is secure
-        allowed_dirs = [
-            os.path.join(self.upload_folder, 'processed'),
-            os.path.join(self.upload_folder, 'uploads')
-        ]
-        
-        if not SecurityUtils.validate_file_path(file_path, allowed_dirs):
+        if not SecurityUtils.is_path_within(file_path, self._download_roots):
             current_app.logger.warning(f"Insecure file path access attempt: {file_path}")
             return None
         
@@ -521,13 +546,7 @@ class FileManager:
     
     def validate_storage_path(self, file_path):
         """Validate that file path is within allowed storage areas."""
-        allowed_dirs = [
-            os.path.join(self.upload_folder, 'uploads'),
-            os.path.join(self.upload_folder, 'processed'),
-            os.path.join(self.upload_folder, 'temp')
-        ]
-        
-        return SecurityUtils.validate_file_path(file_path, allowed_dirs)
+        return SecurityUtils.is_path_within(file_path, self._storage_roots)
     
     def get_file_info(self, file_path):
         """Get information about a file."""
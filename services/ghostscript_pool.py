@@ -0,0 +1,248 @@
+import os
+import selectors
+import subprocess
+import threading
+import time
+import uuid
+from collections import deque
+
+# Closes and finalizes the current pdfwrite output
+RESET_OUTPUT = '<< /OutputFile (/dev/null) >> setpagedevice'
+
+# Command-line switches that configure the interpreter rather than the
+# pdfwrite device, so they cannot be pushed per job via setdistillerparams
+PROCESS_SWITCHES = {'DEVICE', 'OutputFile', 'NOPAUSE', 'QUIET', 'BATCH', 'SAFER'}
+
+def ps_string(value):
+    """Quote a Python string as a PostScript string literal."""
+    escaped = value.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return f'({escaped})'
+
+def ps_value(value):
+    """Convert a -d/-s command-line value to a PostScript token."""
+    if value.startswith('/') or value in ('true', 'false'):
+        return value
+    try:
+        float(value)
+        return value
+    except ValueError:
+        return ps_string(value)
+
+def parse_ghostscript_command(command):
+    """Split a one-shot pdfwrite command into (input, output, distiller params)."""
+    input_path = command[-1]
+    output_path = None
+    params = []
+    
+    for arg in command[1:-1]:
+        if not arg.startswith(('-d', '-s')) or '=' not in arg:
+            continue
+        
+        key, value = arg[2:].split('=', 1)
+        if key == 'OutputFile':
+            output_path = value
+        elif key not in PROCESS_SWITCHES:
+            params.append(f'/{key} {ps_value(value)}')
+    
+    return input_path, output_path, params
+
+class GhostscriptWorker:
+    """A long-lived Ghostscript interpreter fed PostScript over stdin."""
+    
+    def __init__(self, command):
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            close_fds=False  # Allows the posix_spawn fast path
+        )
+        self.jobs_run = 0
+    
+    @property
+    def alive(self):
+        return self.process.poll() is None
+    
+    def send(self, program, timeout, epilogue=''):
+        """Run a PostScript program and wait for its sentinel.
+        
+        epilogue runs after the program whether or not it raised a
+        PostScript error. Returns a (success, output) tuple. Raises
+        TimeoutError if the sentinel is not seen before the deadline.
+        """
+        token = uuid.uuid4().hex
+        wrapped = (
+            f'{{ {program} }} stopped '
+            f'{{ {epilogue} }} stopped pop '
+            f'{{ (ERROR-{token}) }} {{ (DONE-{token}) }} ifelse = flush '
+            'clear cleardictstack\n'
+        )
+        self.process.stdin.write(wrapped.encode('utf-8'))
+        self.process.stdin.flush()
+        self.jobs_run += 1
+        
+        deadline = time.monotonic() + timeout
+        output = []
+        pending = b''
+        
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.process.stdout, selectors.EVENT_READ)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError('Ghostscript worker timed out')
+                
+                if not selector.select(remaining):
+                    continue
+                
+                chunk = os.read(self.process.stdout.fileno(), 4096)
+                if not chunk:
+                    raise RuntimeError('Ghostscript worker exited unexpectedly')
+                
+                pending += chunk
+                *lines, pending = pending.split(b'\n')
+                for raw_line in lines:
+                    line = raw_line.decode('utf-8', 'replace')
+                    if line == f'DONE-{token}':
+                        return True, '\n'.join(output)
+                    if line == f'ERROR-{token}':
+                        return False, '\n'.join(output)
+                    output.append(line)
+    
+    def close(self):
+        """Terminate the interpreter."""
+        try:
+            if self.alive:
+                self.process.stdin.close()
+                self.process.kill()
+            self.process.wait(timeout=5)
+        except Exception:
+            pass
+
+class GhostscriptPool:
+    """Pool of persistent Ghostscript interpreters.
+    
+    Amortizes interpreter start-up and font initialization across jobs.
+    Workers are recycled after max_jobs_per_worker jobs to cap memory growth.
+    Compression uses pdfwrite workers; inspection uses nulldevice workers,
+    which interpret files without producing output.
+    """
+    
+    def __init__(self, ghostscript_path, size, max_jobs_per_worker=50,
+                 permitted_paths=None, logger=None, device='pdfwrite'):
+        self.ghostscript_path = ghostscript_path
+        self.device = device
+        self.size = size
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.permitted_paths = permitted_paths or []
+        self.logger = logger
+        self._idle = deque()
+        self._spawned = 0
+        # Notified whenever a worker is returned or retired
+        self._available = threading.Condition()
+    
+    def _worker_command(self):
+        """Build the command line for an interactive interpreter."""
+        command = [
+            self.ghostscript_path,
+            '-q',
+            '-dNOPAUSE',
+            '-dSAFER',
+            f'-sDEVICE={self.device}',
+        ]
+        if self.device == 'pdfwrite':
+            command.append('-sOutputFile=/dev/null')
+        for path in self.permitted_paths:
+            command.append(f'--permit-file-read={path}')
+            command.append(f'--permit-file-write={path}')
+        command.append('-')
+        return command
+    
+    def _acquire(self, timeout):
+        """Get an idle worker, spawning one if the pool is not full."""
+        deadline = time.monotonic() + timeout
+        with self._available:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                # Retired workers free a slot, so re-check on every wake-up
+                if self._spawned < self.size:
+                    self._spawned += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError('No Ghostscript worker available')
+                self._available.wait(remaining)
+        
+        try:
+            return GhostscriptWorker(self._worker_command())
+        except Exception:
+            with self._available:
+                self._spawned -= 1
+                self._available.notify()
+            raise
+    
+    def _release(self, worker, healthy=True):
+        """Return a worker to the pool or retire it."""
+        if healthy and worker.alive and worker.jobs_run < self.max_jobs_per_worker:
+            with self._available:
+                self._idle.append(worker)
+                self._available.notify()
+            return
+        
+        worker.close()
+        with self._available:
+            self._spawned -= 1
+            self._available.notify()
+    
+    def eval(self, program, timeout=30, epilogue=''):
+        """Run a PostScript snippet on a pooled worker and return its output.
+        
+        Raises RuntimeError if the snippet signals a PostScript error.
+        """
+        worker = self._acquire(timeout)
+        healthy = False
+        try:
+            success, output = worker.send(program, timeout, epilogue)
+            # Retire workers after errors; their interpreter state is unknown
+            healthy = success
+            if not success:
+                raise RuntimeError(output or 'Ghostscript error')
+            return output
+        finally:
+            self._release(worker, healthy)
+    
+    def execute(self, command, timeout):
+        """Run a one-shot pdfwrite command on a pooled worker.
+        
+        Returns True if Ghostscript wrote the output without errors.
+        """
+        input_path, output_path, params = parse_ghostscript_command(command)
+        if not output_path:
+            raise ValueError('Ghostscript command has no -sOutputFile')
+        
+        program = (
+            f'<< /OutputFile {ps_string(output_path)} >> setpagedevice '
+            f'<< {" ".join(params)} >> setdistillerparams '
+            f'{ps_string(input_path)} run'
+        )
+        
+        try:
+            # Switch the output away even on errors, so no later job finalizes this one's file
+            self.eval(program, timeout, epilogue=RESET_OUTPUT)
+            return True
+        except RuntimeError as e:
+            if self.logger:
+                self.logger.error(f"Pooled Ghostscript failed for {input_path}: {e}")
+            return False
+    
+    def shutdown(self):
+        """Terminate all idle workers."""
+        with self._available:
+            workers = list(self._idle)
+            self._idle.clear()
+            self._spawned -= len(workers)
+            self._available.notify_all()
+        
+        for worker in workers:
+            worker.close()
@@ -1,12 +1,66 @@
+import atexit
+import errno
 import os
+import re
+import selectors
+import shutil
+import signal
 import subprocess
+import tempfile
 import time
 import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from flask import current_app
 from models import db
 from models.processing_job import ProcessingJob
 from models.audit_log import AuditLog
+from services.ghostscript_pool import GhostscriptPool, ps_string
+from services.task_queue import CELERY_AVAILABLE, PDF_PROCESSING_QUEUE, process_pdf_task
+
+# Optional imports
+try:
+    from PyPDF2 import PdfReader, PdfWriter
+    PYPDF2_AVAILABLE = True
+except ImportError:
+    PYPDF2_AVAILABLE = False
+
+# PostScript program that prints the page count of the PDF passed after --
+PAGECOUNT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pagecount.ps')
+
+# Fallback processing time per MB (in seconds) until real jobs have been timed
+DEFAULT_SECONDS_PER_MB = {
+    'high': 10,    # High quality takes longer
+    'medium': 6,   # Medium quality
+    'low': 3       # Low quality is fastest
+}
+
+# Weight of each new job in the per-preset throughput average
+THROUGHPUT_EWMA_ALPHA = 0.1
+
+# Jobs finish in Celery workers too, so the averages are rebuilt from history this often
+THROUGHPUT_REFRESH_SECONDS = 600
+
+# Smaller files are dominated by start-up cost and would skew the average
+MIN_THROUGHPUT_SAMPLE_MB = 0.1
+
+# Small PDFs with less image data than this are passed through untouched
+SKIP_COMPRESSION_MAX_IMAGE_BYTES = 50 * 1024
+
+# ...and with less embedded font data than this, which gs could subset away
+SKIP_COMPRESSION_MAX_FONT_BYTES = 20 * 1024
+
+# Quality-preserving PDFSETTINGS; presets using them always run Ghostscript
+NO_SKIP_PDF_SETTINGS = frozenset({'-dPDFSETTINGS=/printer', '-dPDFSETTINGS=/prepress'})
+
+# Font descriptor keys holding embedded font programs
+FONT_FILE_KEYS = ('/FontFile', '/FontFile2', '/FontFile3')
+
+# Number of 1 KiB stderr chunks kept for logging failed runs
+STDERR_TAIL_CHUNKS = 16
+
+# Ghostscript output that means the run cannot succeed
+FATAL_STDERR_PATTERN = re.compile(rb'Unrecoverable error')
 
 class PDFProcessor:
     """PDF compression processor using Ghostscript."""
@@ -19,15 +73,107 @@ class PDFProcessor:
     def init_app(self, app):
         """Initialize PDF processor with Flask app."""
         self.app = app
+        self._logger = app.logger
         self.ghostscript_path = app.config.get('GHOSTSCRIPT_PATH', '/usr/bin/gs')
+        self.upload_folder = app.config.get('UPLOAD_FOLDER', 'storage')
+        self.scratch_dir = app.config.get('PROCESSING_SCRATCH_DIR')
+        self.skip_compression_below = app.config.get('SKIP_COMPRESSION_BELOW_BYTES', 0)
+        self.parallel_page_threshold = app.config.get('PARALLEL_PAGE_THRESHOLD', 0)
         self.processing_timeout = app.config.get('PROCESSING_TIMEOUT', 300)  # 5 minutes
-        self.quality_presets = app.config.get('QUALITY_PRESETS', {})
+        # Copy presets with tuple args so command assembly never rebuilds lists
+        self.quality_presets = {
+            preset_name: {**preset_config, 'ghostscript_args': tuple(preset_config.get('ghostscript_args', ()))}
+            for preset_name, preset_config in app.config.get('QUALITY_PRESETS', {}).items()
+        }
+        
+        # The base command no longer sets PDFSETTINGS, so every preset must
+        for preset_name, preset_config in self.quality_presets.items():
+            settings = [arg for arg in preset_config['ghostscript_args'] if arg.startswith('-dPDFSETTINGS=')]
+            if len(settings) != 1:
+                raise ValueError(
+                    f"Quality preset '{preset_name}' must set -dPDFSETTINGS exactly once, found {len(settings)}"
+                )
+        self.max_concurrent_gs = app.config.get('MAX_CONCURRENT_GS') or os.cpu_count() or 1
+        self._gs_semaphore = threading.BoundedSemaphore(self.max_concurrent_gs)
+        
+        # Invariant prefix of every compression command
+        self._gs_base_args = (
+            self.ghostscript_path,
+            '-sDEVICE=pdfwrite',
+            '-dCompatibilityLevel=1.4',
+            '-dNOPAUSE',
+            '-dQUIET',
+            '-dBATCH',
+            '-dSAFER',
+            '-dAutoRotatePages=/None',
+            '-dColorImageDownsampleType=/Bicubic',
+            '-dGrayImageDownsampleType=/Bicubic',
+            '-dMonoImageDownsampleType=/Bicubic',
+        )
+        
+        # Full constant argv for each preset; only the file paths vary per job
+        self._preset_argv_prefix = {
+            preset_name: self._gs_base_args + preset_config['ghostscript_args']
+            for preset_name, preset_config in self.quality_presets.items()
+        }
+        self.use_task_queue = CELERY_AVAILABLE and bool(app.config.get('CELERY_BROKER_URL'))
+        
+        # Presets don't change after startup, so build their public info once
+        self._preset_info = {
+            preset_name: self._build_preset_info(preset_name, preset_config)
+            for preset_name, preset_config in self.quality_presets.items()
+        }
+        self._available_presets = dict(self._preset_info)
+        
+        # Presets that are never passed through, keyed on their settings rather than names
+        self._no_skip_presets = frozenset(
+            preset_name for preset_name, preset_config in self.quality_presets.items()
+            if NO_SKIP_PDF_SETTINGS.intersection(preset_config['ghostscript_args'])
+        )
+        
+        # Per-preset seconds-per-MB averages, primed from past jobs on first use
+        self._seconds_per_mb = {}
+        self._throughput_primed_at = None
+        self._throughput_lock = threading.Lock()
+        
+        # Pools of warm Ghostscript interpreters (disabled when size is 0)
+        self.gs_pool = None
+        self.inspect_pool = None
+        pool_size = app.config.get('GHOSTSCRIPT_POOL_SIZE', 0)
+        if pool_size > 0:
+            permitted_paths = [os.path.abspath(self.upload_folder) + os.sep]
+            if self.scratch_dir:
+                permitted_paths.append(os.path.abspath(self.scratch_dir) + os.sep)
+            self.gs_pool = GhostscriptPool(
+                self.ghostscript_path,
+                size=pool_size,
+                max_jobs_per_worker=app.config.get('GHOSTSCRIPT_POOL_MAX_JOBS', 50),
+                permitted_paths=permitted_paths,
+                logger=app.logger
+            )
+            atexit.register(self.gs_pool.shutdown)
+            
+            # Validation and page counts run on nulldevice workers, never touching pdfwrite state
+            self.inspect_pool = GhostscriptPool(
+                self.ghostscript_path,
+                size=pool_size,
+                max_jobs_per_worker=app.config.get('GHOSTSCRIPT_POOL_MAX_JOBS', 50),
+                permitted_paths=permitted_paths,
+                logger=app.logger,
+                device='nulldevice'
+            )
+            atexit.register(self.inspect_pool.shutdown)
     
-    def process_pdf(self, job_id, input_path, output_path, quality_preset):
-        """Process PDF file with specified quality preset."""
+    def process_pdf(self, job_id, input_path, output_path, quality_preset, relative_output_path=None):
+        """Process PDF file with specified quality preset.
+        
+        relative_output_path is output_path relative to the upload folder, as
+        returned by file_manager.get_processed_file_paths; it is derived from
+        output_path when omitted.
+        """
         try:
             # Get job from database
-            job = ProcessingJob.query.get(job_id)
+            job = db.session.get(ProcessingJob, job_id)
             if not job:
                 raise ValueError(f"Job {job_id} not found")
             
@@ -43,75 +189,79 @@ class PDFProcessor:
                 quality_preset=quality_preset
             )
             
-            # Get quality preset configuration
-            preset_config = self.quality_presets.get(quality_preset)
-            if not preset_config:
+            # Check quality preset configuration
+            if quality_preset not in self.quality_presets:
                 raise ValueError(f"Invalid quality preset: {quality_preset}")
             
+            # Small, image-light PDFs rarely shrink; pass them through as-is
+            if self._should_skip_compression(input_path, quality_preset):
+                self._logger.info(f"Skipping Ghostscript for small job {job_id}")
+                self._kernel_copy(input_path, output_path)
+                original_size = os.stat(input_path).st_size
+                return self._complete_job(
+                    job, relative_output_path or self._relative_path(output_path),
+                    original_size, original_size, 0, record_throughput=False
+                )
+            
+            # Write to the scratch directory first when one is configured
+            gs_output_path = output_path
+            if self.scratch_dir:
+                gs_output_path = os.path.join(self.scratch_dir, f"job_{job_id}_{os.path.basename(output_path)}")
+            
             # Build Ghostscript command
             gs_command = self._build_ghostscript_command(
-                input_path, output_path, preset_config
+                input_path, gs_output_path, quality_preset
             )
             
-            # Execute Ghostscript with timeout
-            start_time = time.time()
-            success = self._execute_ghostscript(gs_command, job_id)
-            processing_time = time.time() - start_time
+            # Release the DB connection while Ghostscript runs
+            db.session.close()
             
-            if success and os.path.exists(output_path):
-                # Get file sizes
-                original_size = os.path.getsize(input_path)
-                processed_size = os.path.getsize(output_path)
-                
-                # Store relative path for the processed file
-                from services.file_manager import file_manager
-                relative_path = os.path.relpath(output_path, file_manager.upload_folder)
-                
-                # Update job with success
-                job.complete_processing(processed_size, relative_path)
-                db.session.commit()
+            try:
+                # Execute Ghostscript with timeout
+                start_time = time.time()
+                page_count = self._page_count_for_tiling(input_path)
+                if page_count:
+                    success = self._execute_ghostscript_tiled(
+                        input_path, gs_output_path, quality_preset, job_id, page_count
+                    )
+                else:
+                    success = self._execute_ghostscript(gs_command, job_id)
+                processing_time = time.time() - start_time
                 
-                # Log successful processing
-                compression_ratio = processed_size / original_size if original_size > 0 else 0
-                AuditLog.log_processing_complete(
-                    user_id=job.user_id,
-                    job_id=job_id,
-                    ip_address='system',
-                    compression_ratio=compression_ratio,
-                    processing_time=processing_time
-                )
+                # Reload the job in a fresh session
+                job = db.session.get(ProcessingJob, job_id)
+                if not job:
+                    raise ValueError(f"Job {job_id} not found")
                 
-                return {
-                    'success': True,
-                    'message': f"PDF processed successfully. Compression ratio: {compression_ratio:.2f}",
-                    'processed_size': processed_size,
-                    'compression_ratio': compression_ratio,
-                    'relative_path': relative_path
-                }
+                if success and gs_output_path != output_path:
+                    try:
+                        self._move_file(gs_output_path, output_path)
+                    except FileNotFoundError:
+                        success = False
+            finally:
+                # Don't leave partial output behind in the scratch directory (often tmpfs)
+                if gs_output_path != output_path:
+                    try:
+                        os.remove(gs_output_path)
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        self._logger.warning(f"Failed to remove scratch file {gs_output_path}: {e}")
             
-            else:
-                error_msg = "Ghostscript processing failed"
-                job.fail_processing(error_msg)
-                db.session.commit()
-                
-                AuditLog.log_processing_failed(
-                    user_id=job.user_id,
-                    job_id=job_id,
-                    ip_address='system',
-                    error_message=error_msg
+            sizes = self._file_sizes(input_path, output_path) if success else None
+            if sizes:
+                return self._complete_job(
+                    job, relative_output_path or self._relative_path(output_path), *sizes, processing_time
                 )
-                
-                return {
-                    'success': False,
-                    'error': error_msg
-                }
+            
+            return self._fail_job(job, "Ghostscript processing failed")
         
         except Exception as e:
             error_msg = str(e)
-            current_app.logger.error(f"PDF processing failed for job {job_id}: {error_msg}")
+            self._logger.error(f"PDF processing failed for job {job_id}: {error_msg}")
             
             try:
-                job = ProcessingJob.query.get(job_id)
+                job = db.session.get(ProcessingJob, job_id)
                 if job:
                     job.fail_processing(error_msg)
                     db.session.commit()
@@ -123,93 +273,481 @@ class PDFProcessor:
                         error_message=error_msg
                     )
             except Exception as db_error:
-                current_app.logger.error(f"Failed to update job status: {db_error}")
+                self._logger.error(f"Failed to update job status: {db_error}")
             
             return {
                 'success': False,
                 'error': error_msg
             }
     
-    def process_pdf_async(self, job_id, input_path, output_path, quality_preset):
-        """Process PDF asynchronously in background thread."""
+    def process_pdf_async(self, job_id, input_path, output_path, quality_preset, relative_output_path=None):
+        """Process PDF asynchronously on the Celery queue or in a background thread."""
+        if self.use_task_queue:
+            result = process_pdf_task.apply_async(
+                args=[job_id, input_path, output_path, quality_preset, relative_output_path],
+                queue=PDF_PROCESSING_QUEUE
+            )
+            
+            # Record task ID so status polling can surface it
+            job = db.session.get(ProcessingJob, job_id)
+            if job:
+                job.task_id = result.id
+                db.session.commit()
+            
+            return result
+        
+        # Fallback when no broker is configured (e.g. serverless deployments)
         def process_in_background():
             with self.app.app_context():
-                self.process_pdf(job_id, input_path, output_path, quality_preset)
+                self.process_pdf(job_id, input_path, output_path, quality_preset, relative_output_path)
         
         thread = threading.Thread(target=process_in_background)
         thread.daemon = True
         thread.start()
         return thread
     
-    def _build_ghostscript_command(self, input_path, output_path, preset_config):
-        """Build Ghostscript command with preset configuration."""
-        command = [
-            self.ghostscript_path,
-            '-sDEVICE=pdfwrite',
-            '-dCompatibilityLevel=1.4',
-            '-dPDFSETTINGS=/default',
-            '-dNOPAUSE',
-            '-dQUIET',
-            '-dBATCH',
-            '-dSAFER',
-            '-dAutoRotatePages=/None',
-            '-dColorImageDownsampleType=/Bicubic',
-            '-dGrayImageDownsampleType=/Bicubic',
-            '-dMonoImageDownsampleType=/Bicubic',
-        ]
+    @staticmethod
+    def _file_sizes(input_path, output_path):
+        """Return (original_size, processed_size), or None if the output is missing."""
+        try:
+            processed_size = os.stat(output_path).st_size
+            original_size = os.stat(input_path).st_size
+        except FileNotFoundError:
+            return None
+        return original_size, processed_size
+    
+    def _relative_path(self, output_path):
+        """Get a processed file's path relative to the upload folder."""
+        return os.path.relpath(output_path, self.upload_folder)
+    
+    def _complete_job(self, job, relative_path, original_size, processed_size, processing_time,
+                      record_throughput=True):
+        """Record a successful compression and build the result dict.
+        
+        Pass record_throughput=False for jobs that skipped Ghostscript, so their
+        near-zero times don't drag down the processing time estimates.
+        """
+        # Update job with success
+        job.complete_processing(processed_size, relative_path)
+        db.session.commit()
         
-        # Add preset-specific arguments
-        command.extend(preset_config['ghostscript_args'])
+        if record_throughput:
+            self._record_throughput(job.quality_preset, original_size, processing_time)
         
-        # Add input and output files
-        command.extend([
+        # Log successful processing
+        compression_ratio = processed_size / original_size if original_size > 0 else 0
+        AuditLog.log_processing_complete(
+            user_id=job.user_id,
+            job_id=job.id,
+            ip_address='system',
+            compression_ratio=compression_ratio,
+            processing_time=processing_time
+        )
+        
+        return {
+            'success': True,
+            'message': f"PDF processed successfully. Compression ratio: {compression_ratio:.2f}",
+            'processed_size': processed_size,
+            'compression_ratio': compression_ratio,
+            'relative_path': relative_path
+        }
+    
+    def _fail_job(self, job, error_msg):
+        """Record a failed compression and build the result dict."""
+        job.fail_processing(error_msg)
+        db.session.commit()
+        
+        AuditLog.log_processing_failed(
+            user_id=job.user_id,
+            job_id=job.id,
+            ip_address='system',
+            error_message=error_msg
+        )
+        
+        return {
+            'success': False,
+            'error': error_msg
+        }
+    
+    def _build_ghostscript_command(self, input_path, output_path, quality_preset):
+        """Build Ghostscript command with preset configuration."""
+        return [
+            *self._preset_argv_prefix[quality_preset],
             f'-sOutputFile={output_path}',
             input_path
-        ])
+        ]
+    
+    def _page_count_for_tiling(self, input_path):
+        """Return the page count if the PDF should be split across gs processes, else None."""
+        # Page ranges need separate processes; pooled workers can't take them
+        if not self.parallel_page_threshold or self.gs_pool is not None or self.max_concurrent_gs < 2:
+            return None
         
-        return command
+        page_count = self.get_pdf_info(input_path, use_pool=False)['page_count']
+        if page_count and page_count > self.parallel_page_threshold:
+            return page_count
+        return None
     
-    def _execute_ghostscript(self, command, job_id):
-        """Execute Ghostscript command with timeout and monitoring."""
-        try:
-            current_app.logger.info(f"Executing Ghostscript for job {job_id}: {' '.join(command)}")
+    def _execute_ghostscript_tiled(self, input_path, output_path, quality_preset, job_id, page_count):
+        """Compress page ranges in parallel gs processes, then merge the parts."""
+        tiles = min(self.max_concurrent_gs, page_count)
+        bounds = [page_count * index // tiles for index in range(tiles + 1)]
+        
+        work_dir = self.scratch_dir or os.path.dirname(output_path)
+        with tempfile.TemporaryDirectory(prefix=f'job_{job_id}_', dir=work_dir) as temp_dir:
+            parts = []
+            commands = []
+            for index in range(tiles):
+                part_path = os.path.join(temp_dir, f'part_{index:03d}.pdf')
+                command = self._build_ghostscript_command(input_path, part_path, quality_preset)
+                command[-2:-2] = [f'-dFirstPage={bounds[index] + 1}', f'-dLastPage={bounds[index + 1]}']
+                parts.append(part_path)
+                commands.append((command, f'{job_id}/{index + 1}'))
             
-            # Start the process
-            process = subprocess.Popen(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
+            # Each run still takes a slot from the concurrent-gs semaphore
+            with ThreadPoolExecutor(max_workers=tiles) as executor:
+                results = list(executor.map(lambda args: self._execute_ghostscript(*args), commands))
             
-            # Wait for completion with timeout
-            try:
-                stdout, stderr = process.communicate(timeout=self.processing_timeout)
-            except subprocess.TimeoutExpired:
-                current_app.logger.error(f"Ghostscript timeout for job {job_id}")
-                process.kill()
-                stdout, stderr = process.communicate()
+            if not all(results):
                 return False
             
-            # Check return code
-            if process.returncode == 0:
-                current_app.logger.info(f"Ghostscript completed successfully for job {job_id}")
+            return self._merge_pdf_parts(parts, output_path, job_id, input_path)
+    
+    def _merge_pdf_parts(self, parts, output_path, job_id, source_path):
+        """Concatenate already-compressed parts without recompressing them."""
+        if PYPDF2_AVAILABLE:
+            try:
+                writer = PdfWriter()
+                for part in parts:
+                    for page in PdfReader(part).pages:
+                        writer.add_page(page)
+                self._copy_document_structure(source_path, writer, job_id)
+                with open(output_path, 'wb') as f:
+                    writer.write(f)
                 return True
-            else:
-                current_app.logger.error(f"Ghostscript failed for job {job_id}. Return code: {process.returncode}")
-                current_app.logger.error(f"Ghostscript stderr: {stderr}")
+            except Exception as e:
+                self._logger.error(f"Failed to merge page ranges for job {job_id}: {e}")
                 return False
         
+        # Without PyPDF2, let gs copy images through: no downsampling or lossy re-encoding
+        merge_command = [
+            *self._gs_base_args,
+            '-dDownsampleColorImages=false',
+            '-dDownsampleGrayImages=false',
+            '-dDownsampleMonoImages=false',
+            '-dPassThroughJPEGImages=true',
+            '-dAutoFilterColorImages=false',
+            '-dAutoFilterGrayImages=false',
+            '-dColorImageFilter=/FlateEncode',
+            '-dGrayImageFilter=/FlateEncode',
+            f'-sOutputFile={output_path}',
+            *parts
+        ]
+        return self._execute_ghostscript(merge_command, job_id)
+    
+    def _copy_document_structure(self, source_path, writer, job_id):
+        """Carry the source's metadata, outline and named destinations into a merged PDF.
+        
+        The merged pages are in source order, so page indexes carry over.
+        AcroForm fields are not rebuilt.
+        """
+        try:
+            reader = PdfReader(source_path)
+            if reader.metadata:
+                writer.add_metadata({
+                    key: value for key, value in reader.metadata.items() if isinstance(value, str)
+                })
+            
+            def add_outline(items, parent=None):
+                last = parent
+                for item in items:
+                    if isinstance(item, list):
+                        # Nested lists are the children of the preceding item
+                        add_outline(item, last)
+                        continue
+                    page_number = reader.get_destination_page_number(item)
+                    if page_number is None or page_number < 0:
+                        last = parent
+                        continue
+                    last = writer.add_outline_item(item.title, page_number, parent)
+            
+            add_outline(reader.outline)
+            
+            for name, destination in reader.named_destinations.items():
+                page_number = reader.get_destination_page_number(destination)
+                if page_number is not None and page_number >= 0:
+                    writer.add_named_destination(name, page_number)
+        except Exception as e:
+            # The pages themselves are fine; only navigation aids are lost
+            self._logger.warning(f"Could not copy outline/metadata for job {job_id}: {e}")
+    
+    def _execute_ghostscript(self, command, job_id):
+        """Execute Ghostscript command with timeout and monitoring."""
+        timeout = self.processing_timeout
+        try:
+            self._logger.info(f"Executing Ghostscript for job {job_id}: {' '.join(command)}")
+            
+            # Run on a warm pooled interpreter when available
+            if self.gs_pool is not None:
+                return self.gs_pool.execute(command, timeout)
+            
+            # Cap concurrent gs processes so bursts can't exhaust memory
+            with self._gs_semaphore:
+                return self._run_ghostscript_process(command, job_id, timeout)
+        
         except FileNotFoundError:
-            current_app.logger.error(f"Ghostscript not found at {self.ghostscript_path}")
+            self._logger.error(f"Ghostscript not found at {self.ghostscript_path}")
             return False
         except Exception as e:
-            current_app.logger.error(f"Unexpected error executing Ghostscript for job {job_id}: {e}")
+            self._logger.error(f"Unexpected error executing Ghostscript for job {job_id}: {e}")
+            return False
+    
+    def _run_ghostscript_process(self, command, job_id, timeout):
+        """Run Ghostscript in a subprocess and report whether it succeeded."""
+        # Start the process
+        # stdout is never read; stderr stays as bytes until it is logged.
+        # close_fds=False skips the fd sweep; our descriptors are
+        # non-inheritable, so none leak. gs gets its own session so a timeout
+        # can kill any helpers it forks (CPython still launches it via vfork).
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            bufsize=-1,
+            close_fds=False,
+            start_new_session=True
+        )
+        
+        # Wait for completion with timeout, keeping only the tail of stderr
+        finished, stderr = self._wait_for_ghostscript(process, job_id, timeout)
+        if not finished:
+            return False
+        
+        # Check return code
+        if process.returncode == 0:
+            self._logger.info(f"Ghostscript completed successfully for job {job_id}")
+            return True
+        else:
+            self._logger.error(f"Ghostscript failed for job {job_id}. Return code: {process.returncode}")
+            self._logger.error(f"Ghostscript stderr: {stderr.decode('utf-8', 'replace')}")
             return False
     
-    def validate_pdf_integrity(self, pdf_path):
-        """Validate PDF file integrity after processing."""
+    def _wait_for_ghostscript(self, process, job_id, timeout):
+        """Drain Ghostscript's stderr until it exits, the deadline passes or it hits a fatal error.
+        
+        Only the last STDERR_TAIL_CHUNKS KiB of stderr are kept. Returns a
+        (finished, stderr) tuple; the process is killed if not finished.
+        """
+        deadline = time.monotonic() + timeout
+        tail = deque(maxlen=STDERR_TAIL_CHUNKS)
+        previous = b''
+        error = None
+        
         try:
+            with selectors.DefaultSelector() as selector:
+                selector.register(process.stderr, selectors.EVENT_READ)
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        error = f"Ghostscript timeout for job {job_id}"
+                        break
+                    
+                    if not selector.select(remaining):
+                        continue
+                    
+                    chunk = os.read(process.stderr.fileno(), 4096)
+                    if not chunk:
+                        break  # EOF, Ghostscript is exiting
+                    
+                    for offset in range(0, len(chunk), 1024):
+                        tail.append(chunk[offset:offset + 1024])
+                    
+                    # Include the previous chunk's end so split markers still match
+                    if FATAL_STDERR_PATTERN.search(previous[-64:] + chunk):
+                        error = f"Ghostscript hit an unrecoverable error for job {job_id}"
+                        break
+                    previous = chunk
+            
+            if error is None:
+                try:
+                    process.wait(timeout=max(deadline - time.monotonic(), 0.1))
+                except subprocess.TimeoutExpired:
+                    error = f"Ghostscript timeout for job {job_id}"
+        finally:
+            process.stderr.close()
+        
+        stderr = b''.join(tail)
+        if error is not None:
+            self._logger.error(error)
+            self._kill_process_group(process)
+            if stderr:
+                self._logger.error(f"Ghostscript stderr: {stderr.decode('utf-8', 'replace')}")
+            return False, stderr
+        
+        return True, stderr
+    
+    def _should_skip_compression(self, input_path, quality_preset):
+        """Check whether a PDF is too small and image- and font-light to benefit from Ghostscript."""
+        if not PYPDF2_AVAILABLE or quality_preset in self._no_skip_presets:
+            return False
+        
+        try:
+            if os.stat(input_path).st_size >= self.skip_compression_below:
+                return False
+            
+            totals = {'image': 0, 'font': 0}
+            seen = set()
+            for page in PdfReader(input_path).pages:
+                if not self._within_skip_budget(self._page_resources(page), totals, seen):
+                    return False
+            
+            return True
+        
+        except Exception as e:
+            self._logger.warning(f"Could not inspect {input_path}, compressing anyway: {e}")
+            return False
+    
+    @staticmethod
+    def _page_resources(page):
+        """Get a page's resources, following /Parent for inherited ones."""
+        node = page
+        while node is not None:
+            if '/Resources' in node:
+                return node['/Resources'].get_object()
+            parent = node.get('/Parent')
+            node = parent.get_object() if parent is not None else None
+        return None
+    
+    @staticmethod
+    def _encoded_length(stream):
+        """Encoded size of a stream; PyPDF2 drops /Length from streams it has parsed."""
+        data = getattr(stream, '_data', None)
+        if data is not None:
+            return len(data)
+        return int(stream.get('/Length', 0))
+    
+    @classmethod
+    def _within_skip_budget(cls, resources, totals, seen):
+        """Add a resource dict's image and font bytes to totals, recursing into forms.
+        
+        Returns False as soon as either total exceeds its pass-through limit.
+        Shared objects are counted once; seen also guards against cycles.
+        """
+        if not resources:
+            return True
+        
+        def first_visit(reference):
+            key = (reference.idnum, reference.generation) if hasattr(reference, 'idnum') else id(reference)
+            if key in seen:
+                return False
+            seen.add(key)
+            return True
+        
+        # Encoded stream sizes; nothing is decoded
+        xobjects = resources.get('/XObject')
+        for reference in (xobjects.get_object().values() if xobjects else ()):
+            if not first_visit(reference):
+                continue
+            xobject = reference.get_object()
+            subtype = xobject.get('/Subtype')
+            if subtype == '/Image':
+                totals['image'] += cls._encoded_length(xobject)
+                if totals['image'] >= SKIP_COMPRESSION_MAX_IMAGE_BYTES:
+                    return False
+            elif subtype == '/Form':
+                form_resources = xobject.get('/Resources')
+                if form_resources and not cls._within_skip_budget(form_resources.get_object(), totals, seen):
+                    return False
+        
+        fonts = resources.get('/Font')
+        for reference in (fonts.get_object().values() if fonts else ()):
+            if not first_visit(reference):
+                continue
+            font = reference.get_object()
+            # Type0 fonts keep their descriptor on the descendant font
+            descendants = font.get('/DescendantFonts')
+            if descendants:
+                font = descendants.get_object()[0].get_object()
+            descriptor = font.get('/FontDescriptor')
+            descriptor = descriptor.get_object() if descriptor else {}
+            for key in FONT_FILE_KEYS:
+                if key in descriptor:
+                    totals['font'] += cls._encoded_length(descriptor[key].get_object())
+            if totals['font'] >= SKIP_COMPRESSION_MAX_FONT_BYTES:
+                return False
+        
+        return True
+    
+    @staticmethod
+    def _kernel_copy(src, dst):
+        """Copy a file inside the kernel with copy_file_range when possible."""
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            try:
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+                return
+            except AttributeError:
+                pass  # copy_file_range needs Python 3.8+ on Linux
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                    raise
+        
+        # shutil uses sendfile on Linux, which still avoids userspace buffers
+        shutil.copyfile(src, dst)
+    
+    @classmethod
+    def _move_file(cls, src, dst):
+        """Move a file, copying in-kernel when it crosses filesystems."""
+        try:
+            os.replace(src, dst)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            cls._kernel_copy(src, dst)
+            os.remove(src)
+    
+    @staticmethod
+    def _kill_process_group(process, grace_period=1):
+        """Stop Ghostscript and any children it forked, escalating to SIGKILL."""
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            process.wait()
+            return
+        
+        try:
+            process.wait(timeout=grace_period)
+        except subprocess.TimeoutExpired:
+            pass
+        
+        # Helpers may outlive the leader, so always finish off the group
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait(timeout=5)
+    
+    def validate_pdf_integrity(self, pdf_path, use_pool=True):
+        """Validate PDF file integrity after processing.
+        
+        Runs on a pooled nulldevice interpreter when the pool is enabled,
+        falling back to a one-off Ghostscript process otherwise.
+        """
+        try:
+            if use_pool and self.inspect_pool is not None:
+                try:
+                    self.inspect_pool.eval(f'{ps_string(pdf_path)} run', timeout=30)
+                    return True
+                except RuntimeError:
+                    # PostScript error while interpreting the file
+                    return False
+                except Exception as e:
+                    self._logger.warning(f"Pooled PDF validation unavailable, using subprocess: {e}")
+            
             # Use Ghostscript to validate PDF
             command = [
                 self.ghostscript_path,
@@ -223,20 +761,40 @@ class PDFProcessor:
             
             process = subprocess.run(
                 command,
-                capture_output=True,
-                timeout=30,  # Short timeout for validation
-                text=True
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                close_fds=False,
+                timeout=30  # Short timeout for validation
             )
             
             return process.returncode == 0
         
         except Exception as e:
-            current_app.logger.error(f"PDF validation failed: {e}")
+            self._logger.error(f"PDF validation failed: {e}")
             return False
     
-    def get_pdf_info(self, pdf_path):
+    def get_pdf_info(self, pdf_path, use_pool=True):
         """Get PDF file information using Ghostscript."""
         try:
+            if use_pool and self.inspect_pool is not None:
+                try:
+                    output = self.inspect_pool.eval(
+                        f'{ps_string(pdf_path)} (r) file runpdfbegin pdfpagecount = runpdfend',
+                        timeout=30
+                    )
+                    lines = output.strip().splitlines()
+                    return {
+                        'page_count': int(lines[-1]),
+                        'valid': True
+                    }
+                except (RuntimeError, ValueError, IndexError):
+                    return {
+                        'page_count': None,
+                        'valid': False
+                    }
+                except Exception as e:
+                    self._logger.warning(f"Pooled PDF inspection unavailable, using subprocess: {e}")
+            
             command = [
                 self.ghostscript_path,
                 '-dNODISPLAY',
@@ -244,20 +802,23 @@ class PDFProcessor:
                 '-dBATCH',
                 '-dQUIET',
                 '-dSAFER',
-                '-c',
-                f'({pdf_path}) (r) file runpdfbegin pdfpagecount = quit'
+                f'--permit-file-read={pdf_path}',
+                '--',
+                PAGECOUNT_SCRIPT,
+                pdf_path
             ]
             
             process = subprocess.run(
                 command,
-                capture_output=True,
-                timeout=30,
-                text=True
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                close_fds=False,
+                timeout=30
             )
             
             if process.returncode == 0:
                 try:
-                    page_count = int(process.stdout.strip())
+                    page_count = int(process.stdout.decode('ascii', 'replace').strip())
                     return {
                         'page_count': page_count,
                         'valid': True
@@ -271,23 +832,71 @@ class PDFProcessor:
             }
         
         except Exception as e:
-            current_app.logger.error(f"Failed to get PDF info: {e}")
+            self._logger.error(f"Failed to get PDF info: {e}")
             return {
                 'page_count': None,
                 'valid': False
             }
     
+    def _record_throughput(self, quality_preset, original_size, processing_time):
+        """Fold a finished job into the preset's seconds-per-MB average."""
+        file_size_mb = original_size / (1024 * 1024)
+        if file_size_mb < MIN_THROUGHPUT_SAMPLE_MB:
+            return
+        
+        sample = processing_time / file_size_mb
+        with self._throughput_lock:
+            current = self._seconds_per_mb.get(quality_preset)
+            if current is None:
+                self._seconds_per_mb[quality_preset] = sample
+            else:
+                self._seconds_per_mb[quality_preset] = (
+                    (1 - THROUGHPUT_EWMA_ALPHA) * current + THROUGHPUT_EWMA_ALPHA * sample
+                )
+    
+    def _prime_throughput(self):
+        """Seed throughput averages from recently completed jobs."""
+        try:
+            jobs = ProcessingJob.query.with_entities(
+                ProcessingJob.quality_preset,
+                ProcessingJob.original_size,
+                ProcessingJob.started_at,
+                ProcessingJob.completed_at
+            ).filter(
+                ProcessingJob.status == 'completed',
+                ProcessingJob.started_at.isnot(None),
+                ProcessingJob.completed_at.isnot(None),
+                # Passed-through jobs are copied unchanged and never ran Ghostscript
+                ProcessingJob.processed_size != ProcessingJob.original_size
+            ).order_by(ProcessingJob.completed_at.desc()).limit(500).all()
+        except Exception as e:
+            self._logger.warning(f"Could not load processing history: {e}")
+            return
+        
+        # Fold oldest first so the newest jobs weigh most in the average
+        for quality_preset, original_size, started_at, completed_at in reversed(jobs):
+            self._record_throughput(
+                quality_preset, original_size, (completed_at - started_at).total_seconds()
+            )
+    
+    def _get_seconds_per_mb(self, quality_preset):
+        """Get the observed seconds per MB for a preset, or the default."""
+        now = time.monotonic()
+        if self._throughput_primed_at is None or now - self._throughput_primed_at > THROUGHPUT_REFRESH_SECONDS:
+            self._throughput_primed_at = now
+            with self._throughput_lock:
+                self._seconds_per_mb = {}
+            self._prime_throughput()
+        
+        seconds_per_mb = self._seconds_per_mb.get(quality_preset)
+        if seconds_per_mb is None:
+            return DEFAULT_SECONDS_PER_MB.get(quality_preset, 6)
+        return seconds_per_mb
+    
     def estimate_processing_time(self, file_size, quality_preset):
         """Estimate processing time based on file size and quality preset."""
-        # Base processing time per MB (in seconds)
-        base_time_per_mb = {
-            'high': 10,    # High quality takes longer
-            'medium': 6,   # Medium quality
-            'low': 3       # Low quality is fastest
-        }
-        
         file_size_mb = file_size / (1024 * 1024)
-        base_time = base_time_per_mb.get(quality_preset, 6)
+        base_time = self._get_seconds_per_mb(quality_preset)
         
         # Calculate estimated time with minimum and maximum bounds
         estimated_seconds = max(30, min(300, int(file_size_mb * base_time)))
@@ -303,12 +912,9 @@ class PDFProcessor:
             else:
                 return f"{minutes} minutes"
     
-    def get_quality_preset_info(self, preset_name):
-        """Get information about a quality preset."""
-        preset = self.quality_presets.get(preset_name)
-        if not preset:
-            return None
-        
+    @staticmethod
+    def _build_preset_info(preset_name, preset):
+        """Build the public description of a quality preset."""
         return {
             'name': preset.get('name', preset_name.title()),
             'description': preset.get('description', ''),
@@ -316,22 +922,24 @@ class PDFProcessor:
             'expected_reduction_percent': int((1 - preset.get('expected_compression', 0.5)) * 100)
         }
     
+    def get_quality_preset_info(self, preset_name):
+        """Get information about a quality preset."""
+        return self._preset_info.get(preset_name)
+    
     def get_available_presets(self):
         """Get all available quality presets."""
-        presets = {}
-        for preset_name, preset_config in self.quality_presets.items():
-            presets[preset_name] = self.get_quality_preset_info(preset_name)
-        return presets
+        return self._available_presets
     
-    @staticmethod
-    def cleanup_failed_processing(job_id, input_path=None, output_path=None):
+    def cleanup_failed_processing(self, job_id, input_path=None, output_path=None):
         """Clean up files from failed processing."""
         try:
-            if output_path and os.path.exists(output_path):
+            if output_path:
                 os.remove(output_path)
-                current_app.logger.info(f"Cleaned up failed output file: {output_path}")
+                self._logger.info(f"Cleaned up failed output file: {output_path}")
+        except FileNotFoundError:
+            pass
         except Exception as e:
-            current_app.logger.error(f"Failed to cleanup failed processing files: {e}")
+            self._logger.error(f"Failed to cleanup failed processing files: {e}")
 
 # Create global PDF processor instance
 pdf_processor = PDFProcessor()
\ No newline at end of file
@@ -0,0 +1,51 @@
+"""Celery task queue for background PDF processing."""
+
+# Optional imports
+try:
+    from celery import Celery
+    CELERY_AVAILABLE = True
+except ImportError:
+    CELERY_AVAILABLE = False
+
+PDF_PROCESSING_QUEUE = 'pdf_processing'
+
+# Create global Celery instance (configured in init_celery)
+celery = Celery('pdf') if CELERY_AVAILABLE else None
+
+def init_celery(app):
+    """Configure Celery from the Flask app config.
+    
+    Returns the Celery instance, or None when Celery is not installed or
+    no broker is configured (processing then falls back to threads).
+    """
+    broker_url = app.config.get('CELERY_BROKER_URL')
+    if celery is None or not broker_url:
+        return None
+    
+    celery.conf.update(
+        broker_url=broker_url,
+        result_backend=app.config.get('CELERY_RESULT_BACKEND') or broker_url,
+        task_default_queue=PDF_PROCESSING_QUEUE,
+        # Re-queue jobs from crashed workers and don't hoard long-running tasks
+        task_acks_late=True,
+        task_reject_on_worker_lost=True,
+        worker_prefetch_multiplier=1,
+        task_time_limit=app.config.get('PROCESSING_TIMEOUT', 300) + 30,
+        # Each task runs one gs process, so cap worker processes the same way
+        worker_concurrency=app.config.get('MAX_CONCURRENT_GS'),
+    )
+    return celery
+
+if CELERY_AVAILABLE:
+    @celery.task(bind=True, name='pdf.process_pdf', queue=PDF_PROCESSING_QUEUE, acks_late=True)
+    def process_pdf_task(self, job_id, input_path, output_path, quality_preset, relative_output_path=None):
+        """Process a PDF job inside a Celery worker."""
+        # Import here to avoid circular import
+        from services.pdf_processor import pdf_processor
+        
+        with pdf_processor.app.app_context():
+            return pdf_processor.process_pdf(
+                job_id, input_path, output_path, quality_preset, relative_output_path
+            )
+else:
+    process_pdf_task = None
@@ -1,27 +1,106 @@
 # Test configuration and utilities
 
+import atexit
+import functools
+import io
 import os
 import tempfile
 import pytest
+from unittest.mock import patch
+from sqlalchemy import event
+from sqlalchemy.orm import scoped_session, sessionmaker
+from werkzeug.security import generate_password_hash
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Response
 from app import create_app
 from models import db
 from models.user import User
 from models.processing_job import ProcessingJob
 from models.audit_log import AuditLog
+from services.pdf_processor import pdf_processor
 
 
-@pytest.fixture
-def app():
-    """Create and configure a test Flask application."""
-    # Create a temporary database file
-    db_fd, db_path = tempfile.mkstemp()
+# Seed-user password hashes, computed once with a single PBKDF2 iteration
+# (check_password_hash reads the method from the hash, so logins still work)
+TEST_PASSWORD_HASHES = {
+    password: generate_password_hash(password, method='pbkdf2:sha256:1')
+    for password in ('admin123', 'user123', 'pending123')
+}
+
+# One scratch directory per test process, removed in a single pass at exit
+_TEST_TMPDIR = tempfile.TemporaryDirectory(prefix='pdf-compressor-tests-')
+atexit.register(_TEST_TMPDIR.cleanup)
+
+# Simple PDF header - this is a minimal valid PDF, shared by all tests
+SAMPLE_PDF_BYTES = b"""%PDF-1.4
+1 0 obj
+<<
+/Type /Catalog
+/Pages 2 0 R
+>>
+endobj
+
+2 0 obj
+<<
+/Type /Pages
+/Kids [3 0 R]
+/Count 1
+>>
+endobj
+
+3 0 obj
+<<
+/Type /Page
+/Parent 2 0 R
+/MediaBox [0 0 612 792]
+/Contents 4 0 R
+>>
+endobj
+
+4 0 obj
+<<
+/Length 44
+>>
+stream
+BT
+/F1 12 Tf
+72 720 Td
+(Hello World) Tj
+ET
+endstream
+endobj
+
+xref
+0 5
+0000000000 65535 f 
+0000000009 00000 n 
+0000000058 00000 n 
+0000000115 00000 n 
+0000000204 00000 n 
+trailer
+<<
+/Size 5
+/Root 1 0 R
+>>
+startxref
+297
+%%EOF"""
+
+
+@functools.lru_cache(maxsize=None)
+def get_test_app(config_name='testing'):
+    """Build and seed one Flask application per config name.
     
-    app = create_app('testing')
+    Tests share it; the db_transaction fixture rolls back their writes.
+    """
+    # TestingConfig uses an in-memory SQLite database on a StaticPool
+    app = create_app(config_name)
     
     # Override specific test configurations
+    upload_folder = os.path.join(_TEST_TMPDIR.name, f'uploads-{config_name}')
+    os.mkdir(upload_folder)
     app.config.update({
-        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
-        'UPLOAD_FOLDER': tempfile.mkdtemp(),
+        'UPLOAD_FOLDER': upload_folder,
     })
 
     with app.app_context():
@@ -34,7 +113,7 @@ def app():
             is_active=True,
             is_admin=True
         )
-        admin_user.set_password('admin123')
+        admin_user.password_hash = TEST_PASSWORD_HASHES['admin123']
         db.session.add(admin_user)
         
         # Create a test regular user
@@ -44,7 +123,7 @@ def app():
             is_active=True,
             is_admin=False
         )
-        regular_user.set_password('user123')
+        regular_user.password_hash = TEST_PASSWORD_HASHES['user123']
         db.session.add(regular_user)
         
         # Create a pending user
@@ -54,16 +133,73 @@ def app():
             is_active=False,
             is_admin=False
         )
-        pending_user.set_password('pending123')
+        pending_user.password_hash = TEST_PASSWORD_HASHES['pending123']
         db.session.add(pending_user)
         
         db.session.commit()
+        
+        _enable_sqlite_savepoints(db.engine)
+        
+        # Commits inside tests release a SAVEPOINT instead of the outer transaction
+        db.session.remove()
+        db.session.configure(join_transaction_mode='create_savepoint')
+
+    return app
+
 
-    yield app
+def _enable_sqlite_savepoints(engine):
+    """Let SQLAlchemy, not pysqlite, emit BEGIN so SAVEPOINTs nest properly."""
+    with engine.connect() as connection:
+        connection.connection.driver_connection.isolation_level = None
+    
+    @event.listens_for(engine, 'begin')
+    def do_begin(connection):
+        connection.exec_driver_sql('BEGIN')
+
+
+@pytest.fixture(scope='session')
+def app():
+    """Create and configure a test Flask application."""
+    return get_test_app('testing')
 
-    # Cleanup
-    os.close(db_fd)
-    os.unlink(db_path)
+
+@pytest.fixture(scope='session', autouse=True)
+def stub_pdf_processing():
+    """Patch PDF processing once per session so no test spawns Ghostscript."""
+    result = {
+        'success': True,
+        'message': 'PDF processed successfully. Compression ratio: 1.00',
+        'processed_size': len(SAMPLE_PDF_BYTES),
+        'compression_ratio': 1.0,
+        'relative_path': ''
+    }
+    with patch.object(pdf_processor, 'process_pdf', return_value=result) as mock_process:
+        yield mock_process
+
+
+@pytest.fixture(autouse=True)
+def db_transaction(app):
+    """Run each test inside a transaction that is rolled back afterwards."""
+    with app.app_context():
+        engine = db.engine
+    
+    connection = engine.connect()
+    transaction = connection.begin()
+    
+    # Bind db.session to this connection; its commits only release savepoints
+    session = scoped_session(
+        sessionmaker(bind=connection, join_transaction_mode='create_savepoint'),
+        scopefunc=db.session.registry.scopefunc
+    )
+    original_session = db.session
+    db.session = session
+    try:
+        yield connection
+    finally:
+        session.remove()
+        db.session = original_session
+        transaction.rollback()
+        connection.close()
 
 
 @pytest.fixture
@@ -78,134 +214,105 @@ def runner(app):
     return app.test_cli_runner()
 
 
+@pytest.fixture(scope='session')
+def seed_user_ids(app):
+    """Primary keys of the seeded users, looked up once per test session."""
+    with app.app_context():
+        return dict(db.session.query(User.email, User.id).all())
+
+
 @pytest.fixture
-def admin_user(app):
+def admin_user(app, seed_user_ids):
     """Get the test admin user."""
+    # Fresh instance per test so in-memory changes don't leak between tests
     with app.app_context():
-        return User.query.filter_by(email='admin@test.com').first()
+        return db.session.get(User, seed_user_ids['admin@test.com'])
 
 
 @pytest.fixture
-def regular_user(app):
+def regular_user(app, seed_user_ids):
     """Get the test regular user."""
     with app.app_context():
-        return User.query.filter_by(email='user@test.com').first()
+        return db.session.get(User, seed_user_ids['user@test.com'])
 
 
 @pytest.fixture
-def pending_user(app):
+def pending_user(app, seed_user_ids):
     """Get the test pending user."""
     with app.app_context():
-        return User.query.filter_by(email='pending@test.com').first()
+        return db.session.get(User, seed_user_ids['pending@test.com'])
+
+
+@pytest.fixture
+def make_job(app):
+    """Factory for ProcessingJob rows with default test values.
+    
+    Call inside an app context. Jobs are flushed so they get an id; pass
+    commit=True when a later request (new app context) must see the row.
+    """
+    def _make_job(commit=False, **fields):
+        values = {
+            'original_filename': 'test.pdf',
+            'original_size': 1024,
+            'quality_preset': '50',
+            'upload_path': 'uploads/test.pdf',
+        }
+        values.update(fields)
+        job = ProcessingJob(**values)
+        db.session.add(job)
+        if commit:
+            db.session.commit()
+        else:
+            db.session.flush()
+        return job
+    return _make_job
+
+
+def login_client(client, user):
+    """Log the client in by writing Flask-Login's session keys directly.
+    
+    Skips the /auth/login round trip and password check; test_auth covers
+    the login route itself.
+    """
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
 
 
 @pytest.fixture
 def admin_headers(client, admin_user):
     """Login as admin and return headers with session."""
-    response = client.post('/auth/login', data={
-        'email': 'admin@test.com',
-        'password': 'admin123'
-    })
-    assert response.status_code == 302  # Redirect after successful login
+    login_client(client, admin_user)
     return {}
 
 
 @pytest.fixture
 def user_headers(client, regular_user):
     """Login as regular user and return headers with session."""
-    response = client.post('/auth/login', data={
-        'email': 'user@test.com',
-        'password': 'user123'
-    })
-    assert response.status_code == 302  # Redirect after successful login
+    login_client(client, regular_user)
     return {}
 
 
-@pytest.fixture
-def sample_pdf():
-    """Create a sample PDF file for testing."""
-    # This would create a minimal PDF file
-    # For now, we'll return a mock file-like object
-    import io
-    
-    # Simple PDF header - this is a minimal valid PDF
-    pdf_content = b"""%PDF-1.4
-1 0 obj
-<<
-/Type /Catalog
-/Pages 2 0 R
->>
-endobj
-
-2 0 obj
-<<
-/Type /Pages
-/Kids [3 0 R]
-/Count 1
->>
-endobj
-
-3 0 obj
-<<
-/Type /Page
-/Parent 2 0 R
-/MediaBox [0 0 612 792]
-/Contents 4 0 R
->>
-endobj
+@pytest.fixture(scope='session')
+def sample_pdf_bytes():
+    """Raw bytes of the sample PDF, shared by the whole test session."""
+    return SAMPLE_PDF_BYTES
 
-4 0 obj
-<<
-/Length 44
->>
-stream
-BT
-/F1 12 Tf
-72 720 Td
-(Hello World) Tj
-ET
-endstream
-endobj
 
-xref
-0 5
-0000000000 65535 f 
-0000000009 00000 n 
-0000000058 00000 n 
-0000000115 00000 n 
-0000000204 00000 n 
-trailer
-<<
-/Size 5
-/Root 1 0 R
->>
-startxref
-297
-%%EOF"""
-    
-    return io.BytesIO(pdf_content)
+@pytest.fixture
+def sample_pdf(sample_pdf_bytes):
+    """Create a sample PDF file for testing."""
+    # Fresh stream per test since callers read and seek it
+    return io.BytesIO(sample_pdf_bytes)
 
 
-def create_test_file(filename, content=b"test content", size=None):
-    """Create a temporary test file."""
-    temp_dir = tempfile.mkdtemp()
-    file_path = os.path.join(temp_dir, filename)
-    
-    if size:
-        content = b"x" * size
-    
-    with open(file_path, 'wb') as f:
-        f.write(content)
+def raw_request(app, method, path, **headers):
+    """Run a request straight through app.wsgi_app without the test client.
     
-    return file_path
-
-
-def cleanup_test_files(*paths):
-    """Clean up test files and directories."""
-    for path in paths:
-        if os.path.exists(path):
-            if os.path.isfile(path):
-                os.unlink(path)
-            else:
-                import shutil
-                shutil.rmtree(path, ignore_errors=True)
+    For status-code-only checks; there is no cookie jar or session handling.
+    """
+    builder = EnvironBuilder(method=method, path=path, headers=headers)
+    try:
+        return Response.from_app(app.wsgi_app, builder.get_environ())
+    finally:
+        builder.close()
@@ -1,4 +1,19 @@
-from .security import SecurityUtils, RateLimiter
-from .validators import FileValidator, InputValidator
+from importlib import import_module
 
-__all__ = ['SecurityUtils', 'RateLimiter', 'FileValidator', 'InputValidator']
\ No newline at end of file
+# Submodules are imported on first attribute access (PEP 562) so that
+# importing e.g. utils.timezone doesn't pull in Flask, models and magic
+_LAZY_EXPORTS = {
+    'SecurityUtils': '.security',
+    'RateLimiter': '.security',
+    'FileValidator': '.validators',
+    'InputValidator': '.validators',
+}
+
+__all__ = ['SecurityUtils', 'RateLimiter', 'FileValidator', 'InputValidator']
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        value = getattr(import_module(_LAZY_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
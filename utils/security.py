@@ -1,12 +1,71 @@
 import hashlib
+import mmap
+import re
 import secrets
 import os
 from datetime import datetime, timedelta
-from flask import request, current_app
+from flask import request, current_app, g
 from models import db
 from models.user import User
 from models.audit_log import AuditLog
 
+# Optional imports
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Read size for hashing when hashlib.file_digest is unavailable (Python < 3.11)
+HASH_CHUNK_SIZE = 1024 * 1024  # 1MB
+# Random data is written in slabs of this size during secure deletion
+OVERWRITE_CHUNK_SIZE = 1024 * 1024  # 1MB
+# Copy-on-write filesystems write overwrites to new blocks, leaving the old data behind
+COPY_ON_WRITE_FILESYSTEMS = frozenset({'btrfs', 'zfs', 'apfs', 'bcachefs'})
+
+# Failed-login counters in Redis expire after the rate limit window
+LOGIN_WINDOW_SECONDS = 3600
+LOGIN_FAIL_KEY = 'login_fail:{ip}'
+# Fail fast to the audit-log fallback instead of stalling logins on an unreachable Redis
+REDIS_SOCKET_TIMEOUT = 0.5  # seconds
+
+# Path separators and other characters replaced by sanitize_filename
+DANGEROUS_FILENAME_TABLE = str.maketrans(dict.fromkeys('/\\<>:"|?*\0', '_'))
+
+# Common attack patterns looked for in request paths and values (lowercase)
+SUSPICIOUS_PATTERNS = (
+    '../', '.\\', '/etc/', '/proc/', '/sys/',
+    '<script', 'javascript:', 'vbscript:',
+    'union select', 'drop table', 'delete from',
+    '<?php', '<%', '${', '#{',
+)
+SUSPICIOUS_PATTERN_RE = re.compile('|'.join(re.escape(pattern) for pattern in SUSPICIOUS_PATTERNS))
+
+# With pyahocorasick, match all patterns in one pass over each value
+if AHOCORASICK_AVAILABLE:
+    SUSPICIOUS_AUTOMATON = ahocorasick.Automaton()
+    for _pattern in SUSPICIOUS_PATTERNS:
+        SUSPICIOUS_AUTOMATON.add_word(_pattern, _pattern)
+    SUSPICIOUS_AUTOMATON.make_automaton()
+else:
+    SUSPICIOUS_AUTOMATON = None
+
+def find_suspicious_pattern(value):
+    """Return the first suspicious pattern found in a lowercased value, or None."""
+    if SUSPICIOUS_AUTOMATON is not None:
+        for _end_index, pattern in SUSPICIOUS_AUTOMATON.iter(value):
+            return pattern
+        return None
+    
+    match = SUSPICIOUS_PATTERN_RE.search(value)
+    return match.group(0) if match else None
+
 class SecurityUtils:
     """Security utilities for the application."""
     
@@ -36,48 +95,54 @@ class SecurityUtils:
     @staticmethod
     def sanitize_filename(filename):
         """Sanitize filename to remove dangerous characters."""
-        # Remove path separators and dangerous characters
-        dangerous_chars = ['/', '\\', '..', '<', '>', ':', '"', '|', '?', '*', '\0']
-        sanitized = filename
-        
-        for char in dangerous_chars:
-            sanitized = sanitized.replace(char, '_')
+        # Remove path separators and dangerous characters in one pass, then '..'
+        sanitized = filename.translate(DANGEROUS_FILENAME_TABLE).replace('..', '_')
         
         # Limit length
         if len(sanitized) > 255:
-            name, ext = sanitized.rsplit('.', 1) if '.' in sanitized else (sanitized, '')
-            max_name_length = 250 - len(ext) - 1 if ext else 250
-            sanitized = name[:max_name_length]
-            if ext:
-                sanitized += f".{ext}"
+            name, dot, ext = sanitized.rpartition('.')
+            if dot and ext:
+                sanitized = f"{name[:250 - len(ext) - 1]}.{ext}"
+            else:
+                sanitized = sanitized[:250]
         
         return sanitized
     
     @staticmethod
     def get_file_hash(file_path):
         """Generate SHA-256 hash of a file."""
-        hash_sha256 = hashlib.sha256()
         try:
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
+            # Unbuffered: both paths read in large blocks, so skip the extra copy
+            with open(file_path, "rb", buffering=0) as f:
+                # file_digest runs the read/update loop in C
+                if hasattr(hashlib, 'file_digest'):
+                    return hashlib.file_digest(f, 'sha256').hexdigest()
+                
+                hash_sha256 = hashlib.sha256()
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
                     hash_sha256.update(chunk)
-            return hash_sha256.hexdigest()
+                return hash_sha256.hexdigest()
         except (IOError, OSError):
             return None
     
+    @staticmethod
+    def resolve_allowed_roots(allowed_directories):
+        """Resolve directories once into separator-terminated real paths."""
+        return tuple(os.path.join(os.path.realpath(d), '') for d in allowed_directories)
+    
+    @staticmethod
+    def is_path_within(file_path, allowed_roots):
+        """Check a path against roots from resolve_allowed_roots."""
+        # Resolve symlinks and compare whole components, so /data-evil isn't inside /data
+        real_path = os.path.join(os.path.realpath(file_path), '')
+        return real_path.startswith(allowed_roots)
+    
     @staticmethod
     def validate_file_path(file_path, allowed_directories):
         """Validate that file path is within allowed directories."""
-        # Convert to absolute path and resolve any symlinks
-        abs_path = os.path.abspath(file_path)
-        
-        # Check if path is within any allowed directory
-        for allowed_dir in allowed_directories:
-            allowed_abs = os.path.abspath(allowed_dir)
-            if abs_path.startswith(allowed_abs):
-                return True
-        
-        return False
+        return SecurityUtils.is_path_within(
+            file_path, SecurityUtils.resolve_allowed_roots(allowed_directories)
+        )
     
     @staticmethod
     def create_secure_directory(directory_path):
@@ -89,16 +154,13 @@ class SecurityUtils:
             return False
     
     @staticmethod
-    def secure_delete_file(file_path):
+    def secure_delete_file(file_path, overwrite=True):
         """Securely delete a file."""
         try:
             if os.path.exists(file_path):
                 # Overwrite file content before deletion (basic secure deletion)
-                file_size = os.path.getsize(file_path)
-                with open(file_path, "r+b") as f:
-                    f.write(os.urandom(file_size))
-                    f.flush()
-                    os.fsync(f.fileno())
+                if overwrite:
+                    SecurityUtils._overwrite_file(file_path)
                 
                 os.remove(file_path)
                 return True
@@ -106,20 +168,108 @@ class SecurityUtils:
             pass
         return False
     
+    @staticmethod
+    def overwrite_is_effective(path):
+        """Check whether overwriting files under path replaces the data on disk.
+        
+        SSDs remap writes in the flash translation layer and copy-on-write
+        filesystems write to new blocks, so an overwrite there only costs I/O.
+        Unknown storage is assumed to be a rotational disk.
+        """
+        real_path = os.path.realpath(path)
+        
+        # Find the filesystem type from the longest matching mount point
+        try:
+            with open('/proc/self/mounts') as mounts:
+                best_mount, fs_type = '', None
+                for line in mounts:
+                    fields = line.split()
+                    if len(fields) < 3:
+                        continue
+                    mount_point = fields[1].replace('\\040', ' ')
+                    if (real_path == mount_point or real_path.startswith(os.path.join(mount_point, ''))) \
+                            and len(mount_point) > len(best_mount):
+                        best_mount, fs_type = mount_point, fields[2]
+            if fs_type in COPY_ON_WRITE_FILESYSTEMS:
+                return False
+        except OSError:
+            pass
+        
+        # /sys/dev/block/<major>:<minor> links to the device (or partition) directory
+        try:
+            dev = os.stat(real_path).st_dev
+            device_dir = os.path.realpath(f'/sys/dev/block/{os.major(dev)}:{os.minor(dev)}')
+            for candidate in (device_dir, os.path.dirname(device_dir)):
+                rotational_path = os.path.join(candidate, 'queue', 'rotational')
+                if os.path.exists(rotational_path):
+                    with open(rotational_path) as f:
+                        return f.read().strip() != '0'
+        except (OSError, ValueError):
+            pass
+        return True
+    
+    @staticmethod
+    def _overwrite_file(file_path):
+        """Overwrite a file in place with random bytes through a memory map.
+        
+        Reads /dev/urandom straight into the mapping in 1MB slabs, so no
+        intermediate buffers are allocated, then msyncs it to disk.
+        """
+        fd = os.open(file_path, os.O_RDWR)
+        try:
+            file_size = os.fstat(fd).st_size
+            if file_size == 0:
+                return  # Empty files can't be mapped
+            
+            with mmap.mmap(fd, file_size) as mapping:
+                with memoryview(mapping) as view:
+                    SecurityUtils._fill_random(view)
+                mapping.flush()
+        finally:
+            os.close(fd)
+    
+    @staticmethod
+    def _fill_random(view):
+        """Fill a writable memoryview with random bytes in place."""
+        try:
+            urandom = open('/dev/urandom', 'rb', buffering=0)
+        except OSError:
+            # No /dev/urandom (e.g. Windows): fall back to per-slab allocations
+            for offset in range(0, len(view), OVERWRITE_CHUNK_SIZE):
+                end = min(offset + OVERWRITE_CHUNK_SIZE, len(view))
+                view[offset:end] = os.urandom(end - offset)
+            return
+        
+        with urandom:
+            offset = 0
+            while offset < len(view):
+                end = min(offset + OVERWRITE_CHUNK_SIZE, len(view))
+                # readinto may return short counts, so advance by what was read
+                read = urandom.readinto(view[offset:end])
+                if not read:
+                    raise OSError("Short read from /dev/urandom")
+                offset += read
+    
     @staticmethod
     def get_client_info():
         """Get client IP and user agent information."""
+        # Computed once per request; several log calls can ask for it
+        client_info = g.get('_client_info')
+        if client_info is not None:
+            return client_info
+        
+        headers = request.headers
         # Handle X-Forwarded-For header for reverse proxies
-        if 'X-Forwarded-For' in request.headers:
-            ip = request.headers['X-Forwarded-For'].split(',')[0].strip()
-        elif 'X-Real-IP' in request.headers:
-            ip = request.headers['X-Real-IP']
+        forwarded_for = headers.get('X-Forwarded-For')
+        if forwarded_for:
+            ip = forwarded_for.split(',', 1)[0].strip()
         else:
-            ip = request.remote_addr or 'unknown'
+            ip = headers.get('X-Real-IP') or request.remote_addr or 'unknown'
         
-        user_agent = request.headers.get('User-Agent', 'unknown')
+        user_agent = headers.get('User-Agent', 'unknown')
         
-        return ip, user_agent
+        g._client_info = (ip, user_agent)
+        return g._client_info
     
     @staticmethod
     def log_security_event(user_id, event_type, details=None):
@@ -139,6 +289,8 @@ class RateLimiter:
     
     def __init__(self, app=None):
         self.app = app
+        self.redis = None
+        self.login_lockout_enabled = False
         if app:
             self.init_app(app)
     
@@ -150,6 +302,19 @@ class RateLimiter:
         self.daily_storage_limit_mb = app.config.get('DAILY_STORAGE_LIMIT_MB', 200)
         self.session_storage_limit_mb = app.config.get('SESSION_STORAGE_LIMIT_MB', 100)
         self.login_attempts_per_hour = app.config.get('LOGIN_ATTEMPTS_PER_HOUR', 10)
+        
+        # Count failed logins in Redis when available instead of querying audit logs
+        redis_url = app.config.get('REDIS_URL')
+        self.redis = redis.Redis.from_url(
+            redis_url,
+            socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_timeout=REDIS_SOCKET_TIMEOUT
+        ) if REDIS_AVAILABLE and redis_url else None
+        
+        # Enforcing the lockout without Redis would count audit logs on every login
+        self.login_lockout_enabled = app.config.get('LOGIN_LOCKOUT_ENABLED', False) and self.redis is not None
+        if app.config.get('LOGIN_LOCKOUT_ENABLED', False) and self.redis is None:
+            app.logger.warning("LOGIN_LOCKOUT_ENABLED is set but REDIS_URL is not; login lockout is off")
     
     def check_upload_limits(self, user, file_size):
         """Check if user can upload a file."""
@@ -176,20 +341,43 @@ class RateLimiter:
         if not self.enabled:
             return True, "Rate limiting disabled"
         
-        # Count failed login attempts in the last hour
-        one_hour_ago = datetime.utcnow() - timedelta(hours=1)
+        failed_attempts = self._count_failed_logins(ip_address)
+        
+        if failed_attempts >= self.login_attempts_per_hour:
+            return False, f"Too many failed login attempts. Try again later."
+        
+        return True, "Login attempt allowed"
+    
+    def record_failed_login(self, ip_address):
+        """Count a failed login towards the IP's Redis window (no-op without Redis)."""
+        if not self.enabled or self.redis is None:
+            return
+        
+        key = LOGIN_FAIL_KEY.format(ip=ip_address)
+        try:
+            pipeline = self.redis.pipeline()
+            # Only the first failure creates the key and starts the window
+            pipeline.set(key, 0, ex=LOGIN_WINDOW_SECONDS, nx=True)
+            pipeline.incr(key)
+            pipeline.execute()
+        except redis.RedisError as e:
+            self.app.logger.warning(f"Could not record failed login in Redis: {e}")
+    
+    def _count_failed_logins(self, ip_address):
+        """Failed logins from this IP in the last hour."""
+        if self.redis is not None:
+            try:
+                return int(self.redis.get(LOGIN_FAIL_KEY.format(ip=ip_address)) or 0)
+            except redis.RedisError as e:
+                self.app.logger.warning(f"Redis unavailable for login rate limiting, using audit log: {e}")
         
         # Query for failed login attempts from this IP
-        failed_attempts = AuditLog.query.filter(
+        one_hour_ago = datetime.utcnow() - timedelta(hours=1)
+        return AuditLog.query.filter(
             AuditLog.action == 'login_failed',
             AuditLog.ip_address == ip_address,
             AuditLog.created_at >= one_hour_ago
         ).count()
-        
-        if failed_attempts >= self.login_attempts_per_hour:
-            return False, f"Too many failed login attempts. Try again later."
-        
-        return True, "Login attempt allowed"
     
     def get_user_quota_info(self, user):
         """Get user quota information."""
@@ -207,37 +395,26 @@ class RateLimiter:
     @staticmethod
     def is_request_suspicious(request_data=None):
         """Check if request shows suspicious patterns."""
-        suspicious_patterns = [
-            # Common attack patterns
-            '../', '.\\', '/etc/', '/proc/', '/sys/',
-            '<script', 'javascript:', 'vbscript:',
-            'union select', 'drop table', 'delete from',
-            '<?php', '<%', '${', '#{',
-        ]
-        
         # Check URL path
         if request.path:
-            path_lower = request.path.lower()
-            for pattern in suspicious_patterns:
-                if pattern in path_lower:
-                    return True, f"Suspicious path pattern: {pattern}"
+            pattern = find_suspicious_pattern(request.path.lower())
+            if pattern:
+                return True, f"Suspicious path pattern: {pattern}"
         
         # Check query parameters
         if request.args:
             for key, value in request.args.items():
-                value_lower = str(value).lower()
-                for pattern in suspicious_patterns:
-                    if pattern in value_lower:
-                        return True, f"Suspicious query parameter: {pattern} in {key}"
+                pattern = find_suspicious_pattern(str(value).lower())
+                if pattern:
+                    return True, f"Suspicious query parameter: {pattern} in {key}"
         
         # Check form data
         if request_data:
             for key, value in request_data.items():
                 if isinstance(value, str):
-                    value_lower = value.lower()
-                    for pattern in suspicious_patterns:
-                        if pattern in value_lower:
-                            return True, f"Suspicious form data: {pattern} in {key}"
+                    pattern = find_suspicious_pattern(value.lower())
+                    if pattern:
+                        return True, f"Suspicious form data: {pattern} in {key}"
         
         return False, "Request appears normal"
     
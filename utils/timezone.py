@@ -3,7 +3,9 @@
 from datetime import datetime, timezone, timedelta
 
 # IST timezone (UTC+5:30)
-IST = timezone(timedelta(hours=5, minutes=30))
+IST_OFFSET = timedelta(hours=5, minutes=30)
+IST = timezone(IST_OFFSET)
+IST_ISO_SUFFIX = '+05:30'
 
 def now_ist():
     """Get current datetime in IST."""
@@ -36,6 +38,10 @@ def format_ist_datetime(dt, format_str='%Y-%m-%d %H:%M'):
     if dt is None:
         return None
     
+    # IST is a fixed offset, so naive UTC values only need an add for display
+    if dt.tzinfo is None and '%z' not in format_str and '%Z' not in format_str:
+        return (dt + IST_OFFSET).strftime(format_str)
+    
     ist_dt = utc_to_ist(dt)
     return ist_dt.strftime(format_str)
 
@@ -44,5 +50,8 @@ def format_ist_iso(dt):
     if dt is None:
         return None
     
+    if dt.tzinfo is None:
+        return (dt + IST_OFFSET).isoformat() + IST_ISO_SUFFIX
+    
     ist_dt = utc_to_ist(dt)
     return ist_dt.isoformat()
\ No newline at end of file
@@ -1,3 +1,4 @@
+import functools
 import os
 import re
 from werkzeug.utils import secure_filename
@@ -30,10 +31,42 @@ class FileValidator:
         b'%PDF-',  # Standard PDF signature
     ]
     
+    # Characters (and '..') that may never appear in an uploaded filename
+    DANGEROUS_FILENAME_TOKENS = ('/', '\\', '..', '<', '>', ':', '"', '|', '?', '*', '\0')
+    DANGEROUS_FILENAME_CHARS = frozenset('/\\<>:"|?*\0')
+    
+    # Path characters and Windows reserved names, as one compiled alternation
+    SUSPICIOUS_FILENAME_PATTERN = re.compile(
+        r'\.\.|/|\\|<|>|\||\?|\*|\b(?:CON|PRN|AUX|NUL|COM[1-9]|LPT[1-9])\b',
+        re.IGNORECASE
+    )
+    PDF_VERSION_PATTERN = re.compile(br'%PDF-(\d+\.\d+)')
+    SUPPORTED_PDF_VERSION_PATTERN = re.compile(r'^[12]\.\d$')
+    
+    # Bytes of the upload read for signature, MIME and version checks
+    HEADER_SIZE = 8192
+    
     def __init__(self, max_file_size=None):
         """Initialize file validator with optional max file size."""
         self.max_file_size = max_file_size or (25 * 1024 * 1024)  # 25MB default
     
+    def _probe(self, file):
+        """Return (size, header) for an upload, computed once per file object."""
+        probe = getattr(file, '_pdf_probe', None)
+        if probe is None:
+            file.seek(0, os.SEEK_END)
+            file_size = file.tell()
+            file.seek(0)
+            header = file.read(self.HEADER_SIZE)
+            file.seek(0)  # Reset file pointer
+            
+            probe = (file_size, header)
+            try:
+                file._pdf_probe = probe
+            except AttributeError:
+                pass  # File object doesn't take attributes; probe again next time
+        return probe
+    
     def validate_file(self, file, filename=None):
         """Comprehensive file validation."""
         if not file:
@@ -66,11 +99,11 @@ class FileValidator:
         if not filename:
             return False, "Filename is empty"
         
-        # Check for dangerous characters
-        dangerous_chars = ['/', '\\', '..', '<', '>', ':', '"', '|', '?', '*', '\0']
-        for char in dangerous_chars:
-            if char in filename:
-                return False, f"Filename contains invalid character: {char}"
+        # Check for dangerous characters (set test first; the loop only names the culprit)
+        if '..' in filename or not self.DANGEROUS_FILENAME_CHARS.isdisjoint(filename):
+            for char in self.DANGEROUS_FILENAME_TOKENS:
+                if char in filename:
+                    return False, f"Filename contains invalid character: {char}"
         
         # Check extension
         if '.' not in filename:
@@ -85,24 +118,14 @@ class FileValidator:
             return False, "Filename too long (max 255 characters)"
         
         # Check for suspicious patterns
-        suspicious_patterns = [
-            r'\.\.', r'/', r'\\', r'<', r'>', r'\|', r'\?', r'\*',
-            r'CON', r'PRN', r'AUX', r'NUL',  # Windows reserved names
-            r'COM[1-9]', r'LPT[1-9]'
-        ]
-        
-        for pattern in suspicious_patterns:
-            if re.search(pattern, filename, re.IGNORECASE):
-                return False, f"Filename contains suspicious pattern"
+        if self.SUSPICIOUS_FILENAME_PATTERN.search(filename):
+            return False, f"Filename contains suspicious pattern"
         
         return True, "Filename is valid"
     
     def validate_file_size(self, file):
         """Validate file size."""
-        # Seek to end to get file size
-        file.seek(0, os.SEEK_END)
-        file_size = file.tell()
-        file.seek(0)  # Reset file pointer
+        file_size, _ = self._probe(file)
         
         if file_size == 0:
             return False, "File is empty"
@@ -116,10 +139,8 @@ class FileValidator:
     
     def validate_file_content(self, file):
         """Validate file content to ensure it's actually a PDF."""
-        # Read first few bytes to check file signature
-        file.seek(0)
-        header = file.read(1024)  # Read first 1KB
-        file.seek(0)  # Reset file pointer
+        # Every check below works on the one cached header read
+        _, header = self._probe(file)
         
         if not header:
             return False, "File appears to be empty"
@@ -137,9 +158,7 @@ class FileValidator:
         # Try to use python-magic if available for MIME type detection
         if MAGIC_AVAILABLE:
             try:
-                file.seek(0)
-                mime_type = magic.from_buffer(file.read(1024), mime=True)
-                file.seek(0)
+                mime_type = magic.from_buffer(header[:1024], mime=True)
                 
                 if mime_type not in self.ALLOWED_MIME_TYPES:
                     return False, f"File MIME type '{mime_type}' not allowed"
@@ -147,21 +166,12 @@ class FileValidator:
                 # Error in magic detection, but don't fail validation
                 pass
         
-        # Additional PDF structure validation
-        file.seek(0)
-        content = file.read(8192)  # Read first 8KB
-        file.seek(0)
-        
-        # Check for essential PDF elements
-        if b'%PDF-' not in content:
-            return False, "File does not contain PDF header"
-        
         # Look for PDF version
-        pdf_version_match = re.search(br'%PDF-(\d+\.\d+)', content)
+        pdf_version_match = self.PDF_VERSION_PATTERN.search(header)
         if pdf_version_match:
             version = pdf_version_match.group(1).decode('ascii')
             # Accept PDF versions 1.0 to 2.0
-            if not re.match(r'^[12]\.\d$', version):
+            if not self.SUPPORTED_PDF_VERSION_PATTERN.match(version):
                 return False, f"Unsupported PDF version: {version}"
         
         return True, "PDF file content validation passed"
@@ -170,20 +180,14 @@ class FileValidator:
         """Get information about the file."""
         filename = filename or getattr(file, 'filename', 'unknown')
         
-        # Get file size
-        file.seek(0, os.SEEK_END)
-        file_size = file.tell()
-        file.seek(0)
+        # Size and header were read during validation
+        file_size, header = self._probe(file)
         
         # Get file extension
         extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
         
-        # Read header for PDF version
-        header = file.read(1024)
-        file.seek(0)
-        
         pdf_version = "Unknown"
-        pdf_version_match = re.search(br'%PDF-(\d+\.\d+)', header)
+        pdf_version_match = self.PDF_VERSION_PATTERN.search(header)
         if pdf_version_match:
             pdf_version = pdf_version_match.group(1).decode('ascii')
         
@@ -198,7 +202,18 @@ class FileValidator:
 class InputValidator:
     """Input validation utilities."""
     
-    EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+    EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\Z', re.ASCII)
+    EMAIL_MAX_DOTS = 20
+    LETTER_PATTERN = re.compile(r'[A-Za-z]')
+    DIGIT_PATTERN = re.compile(r'\d')
+    NAME_PATTERN = re.compile(r"^[a-zA-Z\s\-'\.]+$")
+    NAME_SUSPICIOUS_PATTERN = re.compile(r'[<>{}()[\]|\\]')
+    # str.translate table deleting control characters except tab and newline
+    CONTROL_CHAR_TABLE = dict.fromkeys(code for code in range(32) if chr(code) not in '\n\t')
+    WEAK_PASSWORDS = frozenset({
+        'password', '12345678', 'qwerty123', 'abc12345',
+        'password123', '12345abc', 'letmein123'
+    })
     PASSWORD_MIN_LENGTH = 8
     NAME_MIN_LENGTH = 2
     NAME_MAX_LENGTH = 100
@@ -212,6 +227,10 @@ class InputValidator:
         if len(email) > 254:  # RFC 5321 limit
             return False, "Email address too long"
         
+        # Cheap structural checks before running the regex
+        if '@' not in email or email.count('.') > InputValidator.EMAIL_MAX_DOTS:
+            return False, "Invalid email format"
+        
         if not InputValidator.EMAIL_PATTERN.match(email):
             return False, "Invalid email format"
         
@@ -239,11 +258,11 @@ class InputValidator:
             return False, "Password too long (max 128 characters)"
         
         # Check for at least one letter
-        if not re.search(r'[A-Za-z]', password):
+        if not InputValidator.LETTER_PATTERN.search(password):
             return False, "Password must contain at least one letter"
         
         # Check for at least one digit
-        if not re.search(r'\d', password):
+        if not InputValidator.DIGIT_PATTERN.search(password):
             return False, "Password must contain at least one number"
         
         # Check for at least one special character (optional but recommended)
@@ -251,12 +270,7 @@ class InputValidator:
         #     return False, "Password should contain at least one special character"
         
         # Check for common weak passwords
-        weak_passwords = [
-            'password', '12345678', 'qwerty123', 'abc12345',
-            'password123', '12345abc', 'letmein123'
-        ]
-        
-        if password.lower() in weak_passwords:
+        if password.lower() in InputValidator.WEAK_PASSWORDS:
             return False, "Password is too common, please choose a stronger password"
         
         return True, "Password is strong"
@@ -276,18 +290,19 @@ class InputValidator:
             return False, f"{field_name} must be less than {InputValidator.NAME_MAX_LENGTH} characters"
         
         # Check for valid characters (letters, spaces, hyphens, apostrophes)
-        if not re.match(r"^[a-zA-Z\s\-'\.]+$", name):
+        if not InputValidator.NAME_PATTERN.match(name):
             return False, f"{field_name} can only contain letters, spaces, hyphens, apostrophes, and periods"
         
         # Check for suspicious patterns
-        if re.search(r'[<>{}()[\]|\\]', name):
+        if InputValidator.NAME_SUSPICIOUS_PATTERN.search(name):
             return False, f"{field_name} contains invalid characters"
         
         return True, f"{field_name} is valid"
     
     @staticmethod
+    @functools.lru_cache(maxsize=1024)
     def validate_quality_preset(quality):
-        """Validate quality preset selection."""
+        """Validate quality preset selection (result is cached per value)."""
         # Support both old presets and new percentage values
         valid_presets = ['high', 'medium', 'low']
         valid_percentages = [20, 30, 40, 50, 60, 70]
@@ -337,12 +352,8 @@ class InputValidator:
         # Strip whitespace
         sanitized = input_string.strip()
         
-        # Remove null bytes
-        sanitized = sanitized.replace('\x00', '')
-        
-        # Remove control characters except newlines and tabs
-        sanitized = ''.join(char for char in sanitized 
-                          if ord(char) >= 32 or char in '\n\t')
+        # Remove null bytes and other control characters except newlines and tabs
+        sanitized = sanitized.translate(InputValidator.CONTROL_CHAR_TABLE)
         
         # Truncate if max_length specified
         if max_length and len(sanitized) > max_length: